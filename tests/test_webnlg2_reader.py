@@ -1,5 +1,1118 @@
 from webnlg2_reader import __version__
 
+# A tokenizer that needs no model download
+LIGHTWEIGHT = {"backend": "spacy3", "lightweight": True}
+
+
+def raw_entry(eid, *triples, lex=None):
+    """A raw corpus entry, lexicalized with one sentence per triple."""
+    tags = {triples[0][0]: "AGENT-1"}
+    for subj, _, obj in triples:
+        tags.setdefault(subj, f"BRIDGE-{len(tags)}")
+        tags.setdefault(obj, f"PATIENT-{len(tags)}")
+    text = " ".join(
+        f"{s.replace('_', ' ')} has {p} {o.replace('_', ' ')}." for s, p, o in triples
+    )
+    template = " ".join(f"{tags[s]} has {p} {tags[o]}." for s, p, o in triples)
+    sentences = "".join(
+        f'<sentence ID="{ix}"><striple>{" | ".join(t)}</striple></sentence>'
+        for ix, t in enumerate(triples, 1)
+    )
+    references = "".join(
+        f'<reference entity="{e}" tag="{t}" type="name">x</reference>'
+        for e, t in tags.items()
+    )
+    lex = lex or (
+        f'<lex comment="good" lid="Id1"><sortedtripleset>{sentences}</sortedtripleset>'
+        f"<references>{references}</references>"
+        f"<text>{text}</text><template>{template}</template></lex>"
+    )
+    mtriples = "".join(f"<mtriple>{' | '.join(t)}</mtriple>" for t in triples)
+    return (
+        f'<entry category="Airport" eid="Id{eid}" size="{len(triples)}">'
+        f"<modifiedtripleset>{mtriples}</modifiedtripleset>{lex}"
+        f"<entitymap>{''.join(f'<entity>{t} | {e}</entity>' for e, t in tags.items())}"
+        "</entitymap></entry>"
+    )
+
+
+def write_raw(root, files):
+    """Writes `{relative path: [raw entry, ...]}` under `root`."""
+    for name, entries in files.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(
+            f"<benchmark><entries>{''.join(entries)}</entries></benchmark>",
+            encoding="utf-8",
+        )
+    return str(root)
+
+
+def small_corpus(root):
+    triples = [
+        ("Aarhus_Airport", "cityServed", "Aarhus"),
+        ("Aarhus", "country", "Denmark"),
+        ("Denmark", "leaderName", "Lars_Løkke_Rasmussen"),
+    ]
+    return write_raw(
+        root,
+        {
+            "test/1triples/Airport.xml": [
+                raw_entry(ix, t) for ix, t in enumerate(triples, 1)
+            ],
+            "test/2triples/Airport.xml": [
+                raw_entry(1, *triples[:2]),
+                raw_entry(2, *triples[1:]),
+            ],
+            "train/1triples/Airport.xml": [raw_entry(1, triples[2])],
+        },
+    )
+
 
 def test_version():
     assert __version__ == "0.1.0"
+
+
+def test_normalize_tags_matches_sequential_replace():
+    from webnlg2_reader.reader import normalize_tags
+
+    def sequential(template, tag2uniq_tag):
+        for tag, uniq_tag in tag2uniq_tag.items():
+            template = template.replace(tag, uniq_tag)
+        for tag in set(tag2uniq_tag.values()):
+            template = template.replace(tag, tag.replace("-", "_"))
+        template = template.replace("BRIDGE-", "BRIDGE_")
+        template = template.replace("AGENT-", "AGENT_")
+        return template.replace("PATIENT-", "PATIENT_")
+
+    tag2uniq_tag = {
+        "AGENT-1": "AGENT-1",
+        "BRIDGE-1": "AGENT-1",
+        "PATIENT-1": "PATIENT-1",
+        "PATIENT-2": "PATIENT-1",
+        "PATIENT-3": "PATIENT-3",
+    }
+    for template in [
+        "AGENT-1 is in BRIDGE-1 .",
+        "BRIDGE-1's leader is PATIENT-2 , and PATIENT-3 ( PATIENT-1 ) .",
+        "A stray BRIDGE- and PATIENT-4 , glued AGENT-1PATIENT-3 .",
+        "",
+    ]:
+        assert normalize_tags(template, tag2uniq_tag) == sequential(
+            template, tag2uniq_tag
+        )
+
+
+def test_compiled_template_matches_string_checks():
+    from webnlg2_reader.templates import CompiledTemplate
+
+    tag2ent = {"AGENT_1": "Aarhus", "BRIDGE_1": "Denmark", "PATIENT_1": "Lars"}
+    for template in [
+        "AGENT_1 is in BRIDGE_1 , led by PATIENT_1 .",
+        "AGENT_1's country is BRIDGE_1 .",
+        "BRIDGE_1 ( PATIENT_1 ) AGENT_1",
+        "The AGENT_ of BRIDGE_1PATIENT_1 .",
+        "",
+    ]:
+        compiled = CompiledTemplate(template, tag2ent)
+        assert str(compiled) == template
+        for tag in tag2ent:
+            assert compiled.has_tag(tag) == (tag in template)
+
+        filled = compiled.fill({"BRIDGE_1": "Denmark"})
+        expected = template.replace("BRIDGE_1", "Denmark")
+        assert str(filled) == expected
+
+        for tags in [{"AGENT_1", "PATIENT_1"}, {"AGENT_1"}]:
+            words = {
+                word
+                for word in expected.split()
+                if "AGENT" in word or "BRIDGE" in word or "PATIENT" in word
+            }
+            assert filled.is_delexicalized(tags) == (words == tags)
+
+
+def test_relexicalize_batch():
+    from webnlg2_reader import relexicalize_batch
+
+    templates = ["AGENT_1 is in BRIDGE_1 .", "PATIENT_1 leads AGENT_1 ( PATIENT_2 )"]
+    ner2ent_list = [
+        {"AGENT_1": "11_Diagonal_Street", "BRIDGE_1": "South_Africa"},
+        {"AGENT_1": "Denmark", "PATIENT_1": "Lars_Løkke_Rasmussen"},
+    ]
+    assert relexicalize_batch(templates, ner2ent_list) == [
+        "11 Diagonal Street is in South Africa .",
+        "Lars Løkke Rasmussen leads Denmark ( PATIENT_2 )",
+    ]
+
+
+def test_record_index(tmp_path):
+    import json
+
+    from webnlg2_reader.index import RecordIndex, build_index
+
+    rows = [
+        {
+            "triples": [["Aarhus", "country", "Denmark"]],
+            "target": "AGENT_1 is in PATIENT_1 .",
+            "target_txt": "Aarhus is in Denmark .",
+            "ner2ent": {"AGENT_1": "Aarhus", "PATIENT_1": "Denmark"},
+        },
+        {
+            "triples": [["Denmark", "leader", "Lars"]],
+            "target": "AGENT_1 is led by PATIENT_1 .",
+            "target_txt": "Denmark is led by Lars .",
+            "ner2ent": {"AGENT_1": "Denmark", "PATIENT_1": "Lars"},
+        },
+    ]
+    data = tmp_path / "test.jsonl"
+    data.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    build_index(str(data))
+
+    with RecordIndex(str(data)) as record_index:
+        assert record_index.size == 2
+        assert record_index.records(entities=["Denmark"]) == rows
+        assert record_index.records(entities=["Denmark"], relations=["leader"]) == [
+            rows[1]
+        ]
+        assert record_index.records(relations=["capital"]) == []
+
+
+def test_triples_hash_ignores_order():
+    from webnlg2_reader.utils import triples_hash
+
+    triples = [["Aarhus", "country", "Denmark"], ["Denmark", "leader", "Lars"]]
+    assert triples_hash(triples) == triples_hash(triples[::-1])
+    assert triples_hash(triples) != triples_hash(triples[:1])
+    assert len(triples_hash(triples)) == 16
+
+
+def test_find_leaks():
+    from webnlg2_reader.leakage import find_leaks
+
+    triples = [["Alan_Bean", "occupation", "Test_pilot"]]
+    row = {"triples": triples, "target_txt": "Alan Bean was a test pilot ."}
+    near = {
+        "triples": triples,
+        "target_txt": "Alan Bean was a test pilot and an astronaut of NASA .",
+    }
+    other = {"triples": triples, "target_txt": "Bananas grow on trees in Brazil ."}
+    report = find_leaks(
+        {"train": [row, other, dict(row)], "test": [dict(row), near]}, threshold=0.3
+    )
+    assert report["exact"] == [
+        [
+            {"split": "train", "line": 0},
+            {"split": "train", "line": 2},
+            {"split": "test", "line": 0},
+        ]
+    ]
+    pairs = {
+        (p["a"]["split"], p["a"]["line"], p["b"]["split"], p["b"]["line"])
+        for p in report["near"]
+    }
+    assert ("test", 0, "train", 0) in pairs
+    # Records of the same split are never compared
+    assert all(a_split != b_split for a_split, _, b_split, _ in pairs)
+    assert all(
+        "train" != p["a"]["split"] or p["a"]["line"] != 1 for p in report["near"]
+    )
+
+
+def test_entity_aligner():
+    from webnlg2_reader.alignment import EntityAligner
+
+    aligner = EntityAligner(["United_States", "United_States_Air_Force", "Bus"])
+    text = "The USAF is part of the U.S. military ."
+    spans = aligner.align(
+        text,
+        {"AGENT_1": "United_States_Air_Force", "PATIENT_1": "United_States"},
+    )
+    assert text[slice(*spans["AGENT_1"])] == "USAF"
+    assert text[slice(*spans["PATIENT_1"])] == "U.S."
+    # Whole words only, and unknown entities are added on demand
+    assert aligner.align("Abus stops .", {"AGENT_1": "Bus"}) == {"AGENT_1": None}
+    assert aligner.align("Alan Bean .", {"AGENT_1": "Alan_Bean"}) == {"AGENT_1": [0, 9]}
+
+
+def test_rephrasing_tables_match_substring_loops():
+    import glob
+    import json
+    import os
+    from itertools import product
+
+    from webnlg2_reader.patterns.misc import rephrasing, rephrasing_must
+    from webnlg2_reader.utils import RephrasingTable
+
+    def substring_loops(entity, table):
+        phrasings = {entity}
+        for s, rephs in table.items():
+            for p in [p for p in set(phrasings) if s in p]:
+                for r in rephs:
+                    phrasings.add(p.replace(s, r))
+        return phrasings
+
+    # Every pair of substrings, and every substring inside other text
+    keys = list(rephrasing) + list(rephrasing_must)
+    vocabulary = {f"{a} {b}" for a, b in product(keys, repeat=2)}
+    vocabulary |= {f"the {k}n of {k}" for k in keys} | {"", "plain"}
+    # The entities of the processed splits, when there are any
+    data_dir = os.path.join(os.path.dirname(__file__), "..", "data", "webnlg")
+    for split_f in glob.glob(os.path.join(data_dir, "*.jsonl")):
+        with open(split_f) as f:
+            for line in f:
+                for ent in json.loads(line)["ner2ent"].values():
+                    vocabulary.add(ent.replace("_", " ").strip('"').lower())
+
+    for table in [rephrasing, rephrasing_must]:
+        compiled = RephrasingTable(table)
+        for entity in vocabulary:
+            assert compiled.apply(entity) == substring_loops(entity, table), entity
+
+
+def test_rephrase_numbers():
+    from webnlg2_reader.utils import classify_numbers, rephrase, unknown_units
+
+    assert classify_numbers(["1.5 (kilometres)", "12", "AC (Milan)"]) == {
+        "1.5 (kilometres)": ("1.5", "kilometres"),
+        "12": ("12", None),
+    }
+    assert {"1.5 km", "1.5km", "1.5 kilometres"} <= rephrase("1.5 (kilometres)")
+    assert {"1234.5 meters", "1,234.5 m"} <= rephrase("1,234.5 (metres)")
+    # Unknown units are kept as written, and collected on every run
+    assert "12 furlongs" in rephrase("12 (furlongs)")
+    assert unknown_units["furlongs"]
+    unknown_units.clear()
+    assert "12 furlongs" in rephrase("12 (furlongs)")
+    assert unknown_units["furlongs"]
+
+
+def test_read_raw_archives(tmp_path, monkeypatch):
+    import tarfile
+    import zipfile
+
+    import pytest
+
+    from webnlg2_reader.reader import raw_file_names, read_raw
+
+    xml = b'<benchmark><entries><entry eid="Id1"/></entries></benchmark>'
+    for name in ["en/test/1triples/Airport.xml", "en/train/1triples/Airport.xml"]:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_bytes(xml)
+
+    with tarfile.open(tmp_path / "raw.tar.gz", "w:gz") as archive:
+        archive.add(tmp_path / "en", arcname="webnlg/en")
+    with zipfile.ZipFile(tmp_path / "raw.zip", "w") as archive:
+        archive.write(tmp_path / "en/test/1triples/Airport.xml", "en/test/a.xml")
+        archive.write(tmp_path / "en/test/1triples/Airport.xml", "v1.5/test/a.xml")
+
+    expected = list(read_raw("test", str(tmp_path / "en")))
+    assert expected[0]["benchmark"]["entries"]["entry"]["@eid"] == "Id1"
+    assert list(read_raw("test", str(tmp_path / "raw.tar.gz"))) == expected
+    with pytest.raises(ValueError, match="more than one test directory"):
+        list(read_raw("test", str(tmp_path / "raw.zip")))
+
+    # The files of every split are listed in one pass over the archive
+    opened = []
+    tarfile_open = tarfile.open
+    monkeypatch.setattr(
+        tarfile, "open", lambda *a, **k: opened.append(a) or tarfile_open(*a, **k)
+    )
+    assert raw_file_names(["test", "train"], str(tmp_path / "raw.tar.gz")) == {
+        "test": ["webnlg/en/test/1triples/Airport.xml"],
+        "train": ["webnlg/en/train/1triples/Airport.xml"],
+    }
+    assert len(opened) == 1
+    with pytest.raises(ValueError, match="no XML files under a dev directory"):
+        raw_file_names(["test", "dev"], str(tmp_path / "raw.tar.gz"))
+
+
+def test_read_raw_version(tmp_path):
+    import zipfile
+
+    import pytest
+
+    from webnlg2_reader.reader import raw_sources
+
+    def xml(eid):
+        return f'<benchmark><entries><entry eid="{eid}"/></entries></benchmark>'
+
+    # A repository archive holds a corpus per version
+    with zipfile.ZipFile(tmp_path / "repo.zip", "w") as archive:
+        for version in ["v1.5", "v1.6"]:
+            root = f"webnlg-master/data/{version}/en"
+            archive.writestr(f"{root}/test/1triples/Airport.xml", xml(version))
+            archive.writestr(f"{root}/train/1triples/Airport.xml", xml("train"))
+    repo = str(tmp_path / "repo.zip")
+
+    with pytest.raises(ValueError, match="more than one test directory"):
+        list(raw_sources("test", repo))
+    assert [name for name, _ in raw_sources("test", repo, "v1.6")] == [
+        "webnlg-master/data/v1.6/en/test/1triples/Airport.xml"
+    ]
+    assert b'eid="v1.5"' in next(raw_sources("test", repo, "v1.5"))[1]
+    with pytest.raises(ValueError, match="data/v2.0/en/test"):
+        list(raw_sources("test", repo, "v2.0"))
+
+    # And so does a checkout
+    with zipfile.ZipFile(repo) as archive:
+        archive.extractall(tmp_path)
+    checkout = str(tmp_path / "webnlg-master")
+    ((name, source),) = raw_sources("test", checkout, "v1.5")
+    assert source == name and name.endswith("v1.5/en/test/1triples/Airport.xml")
+
+
+def test_raw_cache(tmp_path):
+    import pytest
+
+    from webnlg2_reader.reader import download
+
+    mirror = tmp_path / "mirror" / "data" / "v1.6" / "en" / "test"
+    mirror.mkdir(parents=True)
+    (mirror / "a.xml").write_text("a")
+    (mirror / "b.xml").write_text("b")
+    raw = tmp_path / "data" / "webnlg" / "raw"
+    processed = tmp_path / "data" / "webnlg" / "test.jsonl"
+    processed.parent.mkdir(parents=True)
+    processed.write_text("{}\n")
+
+    options = dict(raw=str(raw), cache_dir=str(tmp_path / "cache"))
+    download(source=str(tmp_path / "mirror"), **options)
+    assert (raw / "test" / "a.xml").read_text() == "a"
+
+    # Later calls need no source, and only repair what changed
+    (raw / "test" / "a.xml").write_text("changed")
+    (raw / "test" / "stale.xml").write_text("stale")
+    download(**options)
+    assert sorted(p.name for p in (raw / "test").iterdir()) == ["a.xml", "b.xml"]
+    assert (raw / "test" / "a.xml").read_text() == "a"
+    assert processed.read_text() == "{}\n"
+
+    # Files of no corpus are left alone, and the run refused
+    (raw / "test" / "stale.xml").write_text("stale")
+    (raw / "notes.txt").write_text("notes")
+    with pytest.raises(ValueError, match="notes.txt"):
+        download(**options)
+    assert (raw / "notes.txt").read_text() == "notes"
+    assert (raw / "test" / "stale.xml").exists()
+
+
+def test_source_files_roots(tmp_path):
+    import pytest
+
+    from webnlg2_reader.cache import source_files
+
+    def write(name):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text("x")
+
+    write("repo/README.md")
+    write("repo/data/v1.5/en/test/a.xml")
+    write("bare/test/a.xml")
+    write("bare/train/b.xml")
+    write("other/notes/c.xml")
+
+    # A checkout without the version is not read as a corpus
+    assert [n for n, _ in source_files(str(tmp_path / "repo"), "v1.5")] == [
+        "test/a.xml"
+    ]
+    with pytest.raises(ValueError, match="data/v1.6/en/"):
+        list(source_files(str(tmp_path / "repo"), "v1.6"))
+    # A bare directory only counts as en/ if it holds the split directories
+    assert sorted(n for n, _ in source_files(str(tmp_path / "bare"), "v1.6")) == [
+        "test/a.xml",
+        "train/b.xml",
+    ]
+    with pytest.raises(ValueError):
+        list(source_files(str(tmp_path / "other"), "v1.6"))
+
+
+def test_pipeline_serialize_matches_jsonlines(tmp_path):
+    import jsonlines as jsonl
+
+    from webnlg2_reader.pipeline import serialize
+
+    rows = [{"target_txt": "Aarhus – Tirstrup", "ner2ent": {"AGENT_1": "Ålborg"}}] * 2
+    with jsonl.open(tmp_path / "rows.jsonl", "w") as f:
+        f.write_all(rows)
+    assert (tmp_path / "rows.jsonl").read_text(encoding="utf-8") == serialize(rows)
+
+
+def test_pipeline_matches_save_splits(tmp_path):
+    from webnlg2_reader.pipeline import Pipeline
+    from webnlg2_reader.reader import process_splits, save_splits
+
+    raw = small_corpus(tmp_path / "raw")
+    splits = ["test", "train"]
+    options = dict(nlp_options=LIGHTWEIGHT, raw=raw)
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "piped").mkdir()
+    save_splits(
+        process_splits(splits, parallel=False, **options),
+        splits,
+        out_dir=str(tmp_path / "serial"),
+    )
+    pipeline = Pipeline(
+        executor="fork",
+        num_shards=2,
+        parse_pool="thread",
+        serialize_pool="process",
+        **options,
+    )
+    seen = []
+    totals = pipeline.run(
+        splits, observers={"test": [seen.append]}, out_dir=str(tmp_path / "piped")
+    )
+
+    assert totals == {"test": 3 + 2 * 2, "train": 1}
+    assert len(seen) == totals["test"]
+    for split in splits:
+        assert (tmp_path / "piped" / f"{split}.jsonl").read_bytes() == (
+            tmp_path / "serial" / f"{split}.jsonl"
+        ).read_bytes()
+
+
+def test_pipeline_observer_failure(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import pytest
+
+    from webnlg2_reader.pipeline import Pipeline
+
+    def observer(row):
+        raise RuntimeError("Observer failed")
+
+    pipeline = Pipeline(
+        executor="fork",
+        num_shards=2,
+        queue_size=1,
+        nlp_options=LIGHTWEIGHT,
+        raw=small_corpus(tmp_path / "raw"),
+    )
+    (tmp_path / "out").mkdir()
+    # On its own thread, so that a run that hangs fails the test instead
+    runner = ThreadPoolExecutor(1)
+    run = runner.submit(
+        pipeline.run,
+        ["test", "train"],
+        observers={"test": [observer]},
+        out_dir=str(tmp_path / "out"),
+    )
+    with pytest.raises(RuntimeError, match="Observer failed"):
+        run.result(timeout=60)
+    runner.shutdown(wait=False)
+
+
+def test_checkpoint_resume(tmp_path):
+    from webnlg2_reader.checkpoint import Checkpoint
+
+    save_f = str(tmp_path / "test.jsonl")
+    options = {"raw": "raw"}
+    Checkpoint(save_f, {"raw": "other"}).commit(0, "a.xml", [{"target": "x"}])
+    # A journal of other options is started over
+    checkpoint = Checkpoint(save_f, options, resume=True)
+    assert checkpoint.done == {}
+    checkpoint.commit(0, "a.xml", [{"target": "a"}])
+    checkpoint.commit(2, "c.xml", [{"target": "c"}, {"target": "d"}])
+    with open(checkpoint.journal_f, "a") as f:
+        f.write('{"file": 3, "rec')
+
+    resumed = Checkpoint(save_f, options, resume=True)
+    assert {name: entry["records"] for name, entry in resumed.done.items()} == {
+        "a.xml": 1,
+        "c.xml": 2,
+    }
+    resumed.commit(1, "b.xml", [{"target": "b"}])
+    seen = []
+    assert resumed.assemble([seen.append]) == 4
+    assert [row["target"] for row in seen] == ["a", "b", "c", "d"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "test.jsonl",
+        "test.jsonl.journal",
+    ]
+
+    # An assembled split is done, as long as its output is left as it was
+    done = Checkpoint(save_f, options, resume=True)
+    assert done.assembled and set(done.done) == {"a.xml", "b.xml", "c.xml"}
+    replayed = []
+    assert done.replay([replayed.append]) == 4 and replayed == seen
+    with open(save_f, "a") as f:
+        f.write("\n")
+    assert not Checkpoint(save_f, options, resume=True).assembled
+
+
+def test_quarantine_limit(tmp_path):
+    import json
+
+    import pytest
+
+    from webnlg2_reader.quarantine import Quarantine, QuarantineLimitExceeded
+
+    quarantine_f = str(tmp_path / "quarantine.jsonl")
+    failed = {"eid": "Id1", "exception": "ValueError: Malformed triple"}
+    with Quarantine(quarantine_f, max_entries=1) as quarantine:
+        quarantine.add("test", "a.xml", [])
+        assert quarantine.summary() == "[Info] No entries quarantined"
+        quarantine.add("test", "a.xml", [failed])
+        with pytest.raises(QuarantineLimitExceeded):
+            quarantine.add("train", "b.xml", [dict(failed, eid="Id2")])
+    assert quarantine.exceptions == {"ValueError": 2}
+
+    with open(quarantine_f) as f:
+        records = [json.loads(line) for line in f]
+    assert [(r["split"], r["file"], r["eid"]) for r in records] == [
+        ("test", "a.xml", "Id1"),
+        ("train", "b.xml", "Id2"),
+    ]
+
+    # A resumed run counts what was quarantined before, and only once
+    with open(quarantine_f, "a") as f:
+        f.write('{"split": "train", "fi')
+    with Quarantine(quarantine_f, append=True) as quarantine:
+        assert quarantine.total == 2
+        quarantine.add("train", "b.xml", [dict(failed, eid="Id2")])
+        quarantine.add("train", "b.xml", [dict(failed, eid="Id3")])
+        assert quarantine.total == 3
+    with open(quarantine_f) as f:
+        assert [json.loads(line)["eid"] for line in f] == ["Id1", "Id2", "Id3"]
+
+
+def test_quarantine_keeps_the_run_going(tmp_path, monkeypatch):
+    import json
+
+    import pytest
+
+    from webnlg2_reader import main
+    from webnlg2_reader.quarantine import QuarantineLimitExceeded
+
+    triples = [
+        ("Aarhus_Airport", "cityServed", "Aarhus"),
+        ("Aarhus", "country", "Denmark"),
+    ]
+    # A sentence triple of two parts, which `fix_document` rejects
+    malformed = raw_entry(2, triples[1]).replace(
+        "<striple>Aarhus | country | Denmark</striple>",
+        "<striple>Aarhus | country</striple>",
+    )
+    raw = write_raw(
+        tmp_path / "raw",
+        {
+            "test/1triples/Airport.xml": [
+                raw_entry(1, triples[0]),
+                malformed,
+                raw_entry(3, triples[1]),
+            ],
+            "train/1triples/Airport.xml": [raw_entry(1, triples[0])],
+            "dev/1triples/Airport.xml": [raw_entry(1, triples[1])],
+        },
+    )
+    monkeypatch.chdir(tmp_path)
+    args = ["--tokenizer", "spacy3", "--lightweight", "--raw-path", raw]
+    args += ["--out-dir", "out", "--quarantine"]
+
+    with pytest.raises(ValueError, match="Malformed triple"):
+        main(args[:-1])
+
+    main(args)
+    with open(tmp_path / "out" / "test.jsonl") as f:
+        rows = [json.loads(line) for line in f]
+    # The entries after the malformed one are read all the same
+    assert [row["target"] for row in rows] == [
+        "AGENT_1 has cityServed PATIENT_1 .",
+        "AGENT_1 has country PATIENT_1 .",
+    ]
+    with open(tmp_path / "out" / "quarantine.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert [(r["split"], r["file"], r["eid"]) for r in records] == [
+        ("test", str(tmp_path / "raw" / "test" / "1triples" / "Airport.xml"), "Id2")
+    ]
+    assert records[0]["exception"].startswith("ValueError: Malformed triple")
+
+    with pytest.raises(QuarantineLimitExceeded):
+        main(args + ["--max-quarantined", "0"])
+
+
+def test_dirty_data_report_merges_partial_counts():
+    from collections import Counter
+
+    from webnlg2_reader.dirty import (
+        COUNT_MISMATCH,
+        EMPTY_SENTENCE,
+        MISSING_REFERENCES,
+        DirtyDataReport,
+    )
+
+    whole, first, second = DirtyDataReport(), DirtyDataReport(), DirtyDataReport()
+    counts = [
+        ("test", "a.xml", Counter({COUNT_MISMATCH: 1, EMPTY_SENTENCE: 0})),
+        ("test", "a.xml", Counter({COUNT_MISMATCH: 2, MISSING_REFERENCES: 1})),
+        ("train", "b.xml", Counter({EMPTY_SENTENCE: 3})),
+        ("train", "c.xml", Counter()),
+    ]
+    for ix, (split, file_name, count) in enumerate(counts):
+        whole.add(split, file_name, count)
+        (first if ix % 2 else second).add(split, file_name, count)
+    first += second
+
+    assert first.to_json() == whole.to_json()
+    assert whole.to_json() == {
+        "total": {EMPTY_SENTENCE: 3, MISSING_REFERENCES: 1, COUNT_MISMATCH: 3},
+        "splits": {
+            "test": {
+                "total": {MISSING_REFERENCES: 1, COUNT_MISMATCH: 3},
+                "files": {"a.xml": {MISSING_REFERENCES: 1, COUNT_MISMATCH: 3}},
+            },
+            "train": {
+                "total": {EMPTY_SENTENCE: 3},
+                "files": {"b.xml": {EMPTY_SENTENCE: 3}},
+            },
+        },
+    }
+
+
+def test_dirty_data_report_of_raw_files(tmp_path, monkeypatch):
+    import pytest
+
+    from webnlg2_reader.checkpoint import Checkpoint, save_checkpointed
+    from webnlg2_reader.dirty import (
+        COUNT_MISMATCH,
+        EMPTY_SENTENCE,
+        EMPTY_TRIPLESET,
+        MISSING_REFERENCES,
+        DirtyDataReport,
+    )
+    from webnlg2_reader.reader import process_splits
+
+    airport = ("Aarhus_Airport", "cityServed", "Aarhus")
+    country = ("Aarhus", "country", "Denmark")
+    sentence = f'<sentence ID="1"><striple>{" | ".join(airport)}</striple></sentence>'
+    references = (
+        raw_entry(1, airport).split("<references>")[1].split("</references>")[0]
+    )
+    raw = write_raw(
+        tmp_path / "raw",
+        {
+            "test/1triples/Airport.xml": [
+                raw_entry(1, airport),
+                raw_entry(2, airport).replace(references, ""),
+                raw_entry(3, airport).replace(
+                    sentence, sentence + '<sentence ID="2"/>'
+                ),
+                raw_entry(4, airport).replace(sentence, '<sentence ID="1"/>'),
+            ],
+            "test/2triples/Airport.xml": [
+                raw_entry(1, airport, country),
+                # One sentence of text for two of template and triples
+                raw_entry(2, airport, country).replace(
+                    "Aarhus. Aarhus", "Aarhus, which"
+                ),
+            ],
+            "train/1triples/Airport.xml": [raw_entry(1, airport)],
+        },
+    )
+    one, two = (f"{raw}/test/{n}triples/Airport.xml" for n in (1, 2))
+    expected = {
+        "total": {
+            EMPTY_SENTENCE: 2,
+            EMPTY_TRIPLESET: 1,
+            MISSING_REFERENCES: 1,
+            COUNT_MISMATCH: 1,
+        },
+        "splits": {
+            "test": {
+                "total": {
+                    EMPTY_SENTENCE: 2,
+                    EMPTY_TRIPLESET: 1,
+                    MISSING_REFERENCES: 1,
+                    COUNT_MISMATCH: 1,
+                },
+                "files": {
+                    one: {EMPTY_SENTENCE: 2, EMPTY_TRIPLESET: 1, MISSING_REFERENCES: 1},
+                    two: {COUNT_MISMATCH: 1},
+                },
+            }
+        },
+    }
+    options = dict(nlp_options=LIGHTWEIGHT, raw=raw)
+
+    report = DirtyDataReport()
+    rows = list(process_splits(["test", "train"], False, **options, report=report))
+    assert len(rows) == 1 + 1 + 2 + 1
+    assert report.to_json() == expected
+
+    # A resumed run reports the files committed before it died, too
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "webnlg").mkdir(parents=True)
+    commit = Checkpoint.commit
+
+    def die_after_first_file(self, file_ix, *args):
+        if file_ix:
+            raise KeyboardInterrupt
+        commit(self, file_ix, *args)
+
+    with monkeypatch.context() as patched:
+        patched.setattr(Checkpoint, "commit", die_after_first_file)
+        with pytest.raises(KeyboardInterrupt):
+            save_checkpointed(["test"], False, report=DirtyDataReport(), **options)
+    report = DirtyDataReport()
+    save_checkpointed(["test"], False, resume=True, report=report, **options)
+    assert report.to_json() == expected
+
+
+def test_sample_picks_entries_in_file_order(tmp_path):
+    from webnlg2_reader.reader import RDFFileReader
+    from webnlg2_reader.sampling import Sample
+
+    entries = "".join(
+        f'<entry category="Airport" eid="Id{ix}" size="1"><lex>{ix}</lex></entry>'
+        for ix in range(10)
+    )
+    source = f"<benchmark><entries>{entries}</entries></benchmark>".encode()
+
+    def eids(structure):
+        entries = RDFFileReader._triples_from_obj(
+            structure["benchmark"]["entries"], "entry"
+        )
+        return [entry["@eid"] for entry in entries]
+
+    picked = eids(
+        Sample(4, seed=1).parse("test", "raw/test/1triples/Airport.xml", source)
+    )
+    assert len(picked) == 4
+    assert picked == sorted(picked, key=lambda eid: int(eid[2:]))
+    # Same seed and stratum, from a path instead of archive contents
+    path_f = str(tmp_path / "1triples" / "Airport.xml")
+    (tmp_path / "1triples").mkdir()
+    (tmp_path / "1triples" / "Airport.xml").write_bytes(source)
+    assert eids(Sample(4, seed=1).parse("test", path_f, path_f)) == picked
+    assert eids(Sample(20).parse("test", "1triples/Airport.xml", source)) == [
+        f"Id{ix}" for ix in range(10)
+    ]
+
+
+def test_sample_runs_write_out_of_the_full_splits(tmp_path, monkeypatch):
+    import pytest
+
+    from webnlg2_reader import main
+
+    raw = small_corpus(tmp_path / "raw")
+    write_raw(
+        tmp_path / "raw", {"dev/1triples/Airport.xml": [raw_entry(1, ("a", "b", "c"))]}
+    )
+    monkeypatch.chdir(tmp_path)
+    args = [
+        "--tokenizer",
+        "spacy3",
+        "--lightweight",
+        "--raw-path",
+        raw,
+        "--sample",
+        "1",
+    ]
+    with pytest.raises(SystemExit):
+        main(args)
+    with pytest.raises(SystemExit):
+        main(args + ["--out-dir", "./data/webnlg/"])
+    with pytest.raises(SystemExit):
+        main(args[:-2] + ["--category", "Airport"])
+    with pytest.raises(ValueError, match="Airprot"):
+        main(args + ["--out-dir", "sample", "--category", "Airprot"])
+    assert not (tmp_path / "data").exists()
+
+    main(args + ["--out-dir", "sample", "--dirty-report", "--signature-index"])
+    assert sorted(p.name for p in (tmp_path / "sample").iterdir()) == [
+        "dirty_data.json",
+        "test.jsonl",
+        "test.signatures.json",
+        "train.jsonl",
+        "train.signatures.json",
+        "valid.jsonl",
+        "valid.signatures.json",
+    ]
+    # An entry of each test file, of one and two sentences
+    assert len((tmp_path / "sample" / "test.jsonl").read_text().splitlines()) == 3
+    assert not (tmp_path / "data").exists()
+
+
+def test_filters_skip_files_and_entries():
+    import pytest
+
+    from webnlg2_reader.filters import Filters
+
+    def entry(eid, *triples):
+        return {"@eid": eid, "modifiedtripleset": {"mtriple": list(triples)}}
+
+    structure = {
+        "benchmark": {
+            "entries": {
+                "entry": [
+                    entry("Id1", "Aarhus | country | Denmark"),
+                    entry("Id2", "Aarhus | leaderName | X", "X | country | Denmark"),
+                    entry("Id3", "Aarhus | leaderName | X"),
+                ]
+            }
+        }
+    }
+    filters = Filters(categories=["Airport"], triple_counts=[1, 2])
+    assert filters.keep_file("raw/train/2triples/Airport.xml")
+    assert not filters.keep_file("raw/train/2triples/University.xml")
+    assert not filters.keep_file("raw/train/3triples/Airport.xml")
+    assert not Filters() and filters
+    # Categories may be given as their file names, and must have files
+    assert Filters(categories=["Airport.xml"]).keep_file("1triples/Airport.xml")
+    files = ["raw/test/1triples/Airport.xml", "raw/train/2triples/Building.xml"]
+    Filters(categories=["Airport", "Building.xml"]).check_categories(files)
+    with pytest.raises(ValueError, match="Airprot"):
+        Filters(categories=["Airprot", "Building"]).check_categories(files)
+
+    def eids(filters):
+        entries = filters.select(structure)["benchmark"]["entries"]
+        return [e["@eid"] for e in entries["entry"]] if entries else []
+
+    assert eids(Filters(relations=["country"])) == ["Id1", "Id2"]
+    assert eids(Filters(relations=["country"], triple_counts=[1])) == ["Id1"]
+    assert eids(Filters(eids=["Id3"])) == ["Id3"]
+    assert eids(Filters(eids=["Id3"], relations=["country"])) == []
+
+
+def test_gather_ordered_keeps_order_and_bounds_pending():
+    import random
+
+    from webnlg2_reader.reader import gather_ordered
+
+    rng = random.Random(0)
+    running, done, peak = set(), {}, [0]
+
+    def submit(key, structure):
+        running.add(key)
+        peak[0] = max(peak[0], len(running) + len(done))
+        return key
+
+    def get(key):
+        # Finish running chunks in random order until this one is done
+        while key not in done:
+            finished = rng.choice(sorted(running))
+            running.remove(finished)
+            done[finished] = finished * 10
+        return key, done.pop(key)
+
+    chunks = ((key, {}) for key in range(50))
+    results = list(gather_ordered(chunks, submit, get, max_pending=4))
+    assert results == [(key, key * 10) for key in range(50)]
+    assert peak[0] <= 4
+
+
+def test_fork_executor_matches_serial(tmp_path):
+    from webnlg2_reader.reader import process_splits
+
+    raw = small_corpus(tmp_path)
+    options = dict(nlp_options=LIGHTWEIGHT, raw=raw)
+    serial = list(process_splits(["test", "train"], parallel=False, **options))
+    assert len(serial) == 3 + 2 * 2 + 1
+    assert serial[0][1]["target"] == "AGENT_1 has cityServed PATIENT_1 ."
+    forked = process_splits(["test", "train"], executor="fork", **options)
+    assert list(forked) == serial
+
+
+def test_concurrent_splits_reach_their_files(tmp_path, monkeypatch):
+    import json
+
+    import jsonlines as jsonl
+
+    from webnlg2_reader import reader
+    from webnlg2_reader.reader import process_data, process_files, save_splits
+
+    raw = small_corpus(tmp_path / "raw")
+    options = dict(nlp_options=LIGHTWEIGHT, raw=raw)
+    # As written, with tuples turned into lists
+    expected = {
+        split: json.loads(json.dumps(list(process_data(split, False, **options))))
+        for split in ["test", "train"]
+    }
+
+    # Files are parsed as they are needed, not all of them up front
+    parsed = []
+    parse_raw_file = reader.parse_raw_file
+    monkeypatch.setattr(
+        reader,
+        "parse_raw_file",
+        lambda *args: parsed.append(args[1]) or parse_raw_file(*args),
+    )
+    files = process_files(["test", "train"], parallel=False, **options)
+    assert next(files)[0] == ("test", 0, parsed[0]) and len(parsed) == 1
+    monkeypatch.undo()
+
+    # Records of both splits come out of one pool, and each one lands in
+    # its own split's file, in order
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "webnlg").mkdir(parents=True)
+    splits = reader.process_splits(["test", "train"], executor="fork", **options)
+    save_splits(splits, ["test", "train"])
+    for split, rows in expected.items():
+        with jsonl.open(f"data/webnlg/{split}.jsonl") as f:
+            assert list(f) == rows
+
+    # However finely they are interleaved
+    interleaved = sorted(
+        ((s, ix, row) for s, rows in expected.items() for ix, row in enumerate(rows)),
+        key=lambda item: item[1],
+    )
+    assert [s for s, _, _ in interleaved[:3]] == ["test", "train", "test"]
+    paths = {split: str(tmp_path / f"{split}.jsonl") for split in expected}
+    save_splits([(paths[s], row) for s, _, row in interleaved], list(paths.values()))
+    for split, rows in expected.items():
+        with jsonl.open(paths[split]) as f:
+            assert list(f) == rows
+
+
+def test_lightweight_tokenizer_matches_full_model():
+    import pytest
+
+    pytest.importorskip("en_core_web_md")
+    from webnlg2_reader.tokenizers import get_tokenizer
+
+    full = get_tokenizer("spacy")
+    lightweight = get_tokenizer("spacy", lightweight=True)
+    for text in [
+        "Aarhus Airport ( AAR ) serves the city of Aarhus, Denmark.",
+        "The 11 Diagonal Street's height is 2776.0 mm. It's in South-Africa!",
+        "Alan Bean, a U.S. test pilot, graduated in 1955 with a B.S. from UT Austin.",
+    ]:
+        assert lightweight.word_tokenize(text) == full.word_tokenize(text)
+        assert lightweight.sent_tokenize(text) == full.sent_tokenize(text)
+
+
+def test_regex_sentence_splitter():
+    from webnlg2_reader.sentences import RegexSentenceSplitter
+
+    split = RegexSentenceSplitter()
+    # Abbreviations the sentencizer wrongly ends a sentence after
+    assert split("He met Dr . Bean at St . Louis .") == [
+        "He met Dr . Bean at St . Louis ."
+    ]
+    # Glued sentence-final abbreviations end one before a capitalized word
+    assert split("He got a B.S. He flew .") == ["He got a B.S.", "He flew ."]
+    assert split("He got a B.S. in physics .") == ["He got a B.S. in physics ."]
+    assert split("Born in the U.S. He flew .") == ["Born in the U.S.", "He flew ."]
+    # ... also as the first token of a sentence
+    assert split("He left . B.S. He won .") == ["He left .", "B.S.", "He won ."]
+    # Decimals are not sentence ends, trailing punctuation stays attached
+    assert split("It is 2776.0 mm long . Is it ? ! ) Yes !") == [
+        "It is 2776.0 mm long .",
+        "Is it ? ! )",
+        "Yes !",
+    ]
+    assert split("No final punctuation") == ["No final punctuation"]
+    assert split("  ") == []
+
+
+def test_tokenizer_backends():
+    import pytest
+
+    from webnlg2_reader.tokenizers import (
+        BACKENDS,
+        RegexTokenizer,
+        Spacy3Tokenizer,
+        get_tokenizer,
+    )
+
+    assert set(BACKENDS) == {"spacy2", "spacy3", "regex"}
+    assert isinstance(get_tokenizer("regex"), RegexTokenizer)
+    # spaCy options are accepted and ignored by the regex backend
+    assert isinstance(get_tokenizer("regex", lightweight=True), RegexTokenizer)
+    with pytest.raises(ValueError, match="Unknown tokenizer backend"):
+        get_tokenizer("nltk")
+
+    spacy = pytest.importorskip("spacy")
+    if spacy.__version__.startswith("2."):
+        return
+    assert isinstance(get_tokenizer("spacy", lightweight=True), Spacy3Tokenizer)
+
+
+def test_regex_tokenizer_matches_spacy():
+    import pytest
+
+    pytest.importorskip("spacy")
+    from webnlg2_reader.tokenizers import get_tokenizer
+
+    regex = get_tokenizer("regex")
+    spacy = get_tokenizer("spacy", lightweight=True)
+    for text in [
+        "Aarhus Airport (AAR) serves Aarhus, Denmark.",
+        "It's 2776.0 mm long; isn't it?",
+        "Alan Bean, a U.S. test pilot, met Dr. Bean in St. Louis.",
+        'South-Africa 1955-1960 e.g. "quoted"',
+    ]:
+        assert regex.word_tokenize(text) == spacy.word_tokenize(text)
+    assert regex.word_tokenize("  Aarhus,  Denmark ", lower=True) == "aarhus , denmark"
+    assert regex.sent_tokenize("He got a B.S. He flew .") == [
+        "He got a B.S.",
+        "He flew .",
+    ]
+
+
+def test_dataset_stats_merge_matches_one_pass(tmp_path, monkeypatch):
+    import json
+    import sys
+
+    from webnlg2_reader.reader import process_splits
+    from webnlg2_reader.stats import DatasetStats, processed_stats, raw_stats
+
+    raw = small_corpus(tmp_path / "raw")
+    rows = [
+        row
+        for _, row in process_splits(["test"], False, nlp_options=LIGHTWEIGHT, raw=raw)
+    ]
+    whole = DatasetStats.from_rows(rows).to_json()
+
+    merged = DatasetStats()
+    for shard in (rows[:2], rows[2:3], rows[3:]):
+        merged += DatasetStats.from_rows(shard)
+    assert merged.to_json() == whole
+
+    processed = tmp_path / "test.jsonl"
+    processed.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    # Several chunks per file (the package's `stats` is the CLI command)
+    monkeypatch.setattr(sys.modules["webnlg2_reader.stats"], "CHUNK_LINES", 2)
+    assert processed_stats(str(processed)).to_json() == whole
+    assert processed_stats(str(processed), num_workers=2).to_json() == whole
+    assert raw_stats("test", 1, nlp_options=LIGHTWEIGHT, raw=raw).to_json() == whole
+    assert raw_stats("test", 2, nlp_options=LIGHTWEIGHT, raw=raw).to_json() == whole
+
+
+def test_signature_index_round_trip(tmp_path):
+    from collections import defaultdict
+
+    from webnlg2_reader.index import SignatureIndex, relation_signature
+
+    def row(template, *relations):
+        return {"target": template, "triples": [["a", r, "b"] for r in relations]}
+
+    rows = [
+        row("AGENT_1 is in PATIENT_1 .", "country"),
+        row("AGENT_1 is led by PATIENT_1 .", "leader"),
+        row("AGENT_1 is in PATIENT_1 .", "country"),
+        row("AGENT_1 , in PATIENT_1 .", "country"),
+        row("AGENT_1 is in PATIENT_1 , led by PATIENT_2 .", "leader", "country"),
+    ]
+    index = SignatureIndex()
+    for r in rows:
+        index.add(r)
+    index.save(str(tmp_path / "test.signatures.json"))
+    loaded = SignatureIndex.load(str(tmp_path / "test.signatures.json"))
+
+    # Every template of a signature is found, most frequent first
+    expected = defaultdict(list)
+    for r in rows:
+        signature = relation_signature(p for _, p, _ in r["triples"])
+        if r["target"] not in expected[signature]:
+            expected[signature].append(r["target"])
+    for signature, templates in expected.items():
+        assert loaded.lookup(signature) == index.lookup(signature) == templates
+    assert loaded.lookup(["country", "leader"]) == [rows[4]["target"]]
+    assert loaded.lookup(["capital"]) == []
+
+    # A loaded index keeps growing without duplicating templates
+    loaded.add(rows[3])
+    loaded.add(rows[3])
+    assert loaded.lookup(["country"]) == [rows[3]["target"], rows[0]["target"]]
+    assert len(loaded.templates) == len(index.templates)
@@ -1,33 +1,557 @@
 __version__ = "0.1.0"
 
+import argparse
+import json
 import os
+import sys
+from itertools import chain
 
-from pyannotate_runtime import collect_types
-import ray
 from tqdm import tqdm
 
 from .patterns.constants import DataSetType
-from .reader import download, process_data, save_data
+from .cache import CACHE_DIR
+from .reader import (
+    EXECUTORS,
+    OUT_DIR,
+    RAW_DIR,
+    download,
+    process_data,
+    process_splits,
+    raw_file_names,
+    save_data,
+    save_path,
+    save_splits,
+)
+from .templates import CompiledTemplate, relexicalize, relexicalize_batch
+from .tokenizers import BACKENDS, DEFAULT_BACKEND
 
+__all__ = [
+    "CompiledTemplate",
+    "download",
+    "main",
+    "process_data",
+    "process_splits",
+    "relexicalize",
+    "relexicalize_batch",
+    "save_data",
+    "save_path",
+    "save_splits",
+]
 
 num_cpus = os.cpu_count() or 4
 
-# Make sure workers don't start a copy
-ray.shutdown()
-ray.init(num_cpus=num_cpus, include_dashboard=False)
+COMMANDS = ("process", "download", "stats", "index", "query", "groups", "leakcheck")
+
+
+def add_raw_path_argument(
+    parser: argparse.ArgumentParser, versioned: bool = True
+) -> None:
+    parser.add_argument(
+        "--raw-path",
+        default=RAW_DIR,
+        help="raw corpus directory, or a .tar/.tar.gz/.zip archive read without extracting it",
+    )
+    if versioned:
+        parser.add_argument(
+            "--raw-version",
+            metavar="VERSION",
+            help="with a checkout or archive of the WebNLG repository as --raw-path,"
+            " read its data/VERSION/en/ corpus, e.g. v1.6",
+        )
+
+
+def add_tokenizer_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--tokenizer",
+        choices=["spacy"] + sorted(BACKENDS),
+        default=DEFAULT_BACKEND,
+        help="tokenizer backend (default: $WEBNLG2_TOKENIZER or spacy)",
+    )
+    parser.add_argument(
+        "--lightweight",
+        action="store_true",
+        help="build spaCy backends from spacy.blank instead of en_core_web_md",
+    )
+    parser.add_argument(
+        "--tokenizer-path", help="tokenizer rules saved with save_tokenizer"
+    )
+    parser.add_argument("--sentencizer", choices=["spacy", "regex"], default="spacy")
+
+
+def nlp_options(args: argparse.Namespace) -> dict:
+    return {
+        "backend": args.tokenizer,
+        "lightweight": args.lightweight,
+        "tokenizer_path": args.tokenizer_path,
+        "sentencizer": args.sentencizer,
+    }
+
+
+def process(args: argparse.Namespace) -> None:
+    from .checkpoint import save_checkpointed
+    from .dirty import DirtyDataReport
+    from .filters import Filters
+    from .index import SignatureIndex
+    from .pipeline import Pipeline
+    from .quarantine import Quarantine
+    from .sampling import Sample
+
+    reader_options = {
+        "compile_templates": args.compile_templates,
+        "hash_triples": args.hash_triples,
+        "align_entities": args.align_entities,
+    }
 
-def main():
     # download()
 
-    for v in DataSetType:
-        data_set_type = v.value
-        print(f"[INFO] Processing {data_set_type} set")
+    os.makedirs(args.out_dir, exist_ok=True)
+    # Given without a path, side files go next to the processed splits
+    if args.dirty_report == "":
+        args.dirty_report = os.path.join(args.out_dir, "dirty_data.json")
+    if args.quarantine == "":
+        args.quarantine = os.path.join(args.out_dir, "quarantine.jsonl")
+
+    report = DirtyDataReport() if args.dirty_report else None
+    sample = Sample(args.sample, args.sample_seed) if args.sample else None
+    filters = Filters(args.category, args.triples, args.eid, args.relation)
+
+    quarantine = None
+    if args.quarantine:
+        # A resumed run keeps the entries quarantined before it stopped
+        quarantine = Quarantine(
+            args.quarantine, args.max_quarantined, append=args.resume
+        )
+
+    splits = [v.value for v in DataSetType]
+    if filters.categories:
+        # Up front, as a category may only be in some of the splits
+        file_names = raw_file_names(splits, args.raw_path, args.raw_version)
+        filters.check_categories(chain.from_iterable(file_names.values()))
+    # Either every split on its own, or all of them through one worker pool
+    batches = [splits] if args.concurrent_splits else [[split] for split in splits]
+
+    for batch in batches:
+        print(
+            f"[INFO] Processing {', '.join(batch)} set{'s' if len(batch) > 1 else ''}"
+        )
+
+        signature_indexes = {}
+        if args.signature_index:
+            signature_indexes = {split: SignatureIndex() for split in batch}
+        observers = {split: [index.add] for split, index in signature_indexes.items()}
+
+        if args.checkpoint or args.resume:
+            save_checkpointed(
+                batch,
+                parallel=args.parallel,
+                executor=args.executor,
+                nlp_options=nlp_options(args),
+                reader_options=reader_options,
+                raw=args.raw_path,
+                raw_version=args.raw_version,
+                resume=args.resume,
+                observers=observers,
+                quarantine=quarantine,
+                report=report,
+                sample=sample,
+                filters=filters,
+                out_dir=args.out_dir,
+            )
+        elif args.pipeline:
+            Pipeline(
+                executor=args.executor,
+                parse_workers=args.parse_workers,
+                parse_pool=args.parse_pool,
+                serialize_workers=args.serialize_workers,
+                serialize_pool=args.serialize_pool,
+                queue_size=args.queue_size,
+                nlp_options=nlp_options(args),
+                reader_options=reader_options,
+                raw=args.raw_path,
+                raw_version=args.raw_version,
+                quarantine=quarantine,
+                report=report,
+                sample=sample,
+                filters=filters,
+            ).run(batch, observers, args.out_dir)
+        else:
+            processed = process_splits(
+                batch,
+                parallel=args.parallel,
+                executor=args.executor,
+                nlp_options=nlp_options(args),
+                reader_options=reader_options,
+                raw=args.raw_path,
+                raw_version=args.raw_version,
+                quarantine=quarantine,
+                report=report,
+                sample=sample,
+                filters=filters,
+            )
+            save_splits(
+                tqdm(processed, desc="WebNLG", unit="entry"),
+                batch,
+                observers,
+                args.out_dir,
+            )
+
+        for split, signature_index in signature_indexes.items():
+            signatures_f = save_path(split, args.out_dir).replace(
+                ".jsonl", ".signatures.json"
+            )
+            signature_index.save(signatures_f)
+            print(f"[Info] Saved relation signature index into {signatures_f}")
+
+    if report is not None:
+        report.save(args.dirty_report)
+        print(
+            f"[Info] Saved dirty data counts {report.total()} into {args.dirty_report}"
+        )
+
+    if quarantine is not None:
+        quarantine.close()
+        print(quarantine.summary())
+
+
+def fetch(args: argparse.Namespace) -> None:
+    download(
+        args.repo,
+        args.revision,
+        args.version,
+        source=args.source,
+        raw=args.raw_path,
+        cache_dir=args.cache_dir,
+    )
+
+
+def stats(args: argparse.Namespace) -> None:
+    from .stats import DatasetStats, processed_stats, raw_stats
+
+    total, report = DatasetStats(), {}
+    for split in args.splits:
+        if args.raw:
+            split_stats = raw_stats(
+                "dev" if split == "valid" else split,
+                args.workers,
+                args.executor,
+                nlp_options(args),
+                raw=args.raw_path,
+                raw_version=args.raw_version,
+            )
+        else:
+            split_stats = processed_stats(save_path(split), args.workers)
+        report[split] = split_stats.to_json()
+        total += split_stats
+    report["total"] = total.to_json()
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def index(args: argparse.Namespace) -> None:
+    from .index import build_index
 
-        processed = process_data(data_set_type, parallel=False)
-        save_data(processed, data_set_type)
+    for split in args.splits:
+        print(f"[Info] Indexed {save_path(split)} into {build_index(save_path(split))}")
+
+
+def query(args: argparse.Namespace) -> None:
+    from .index import RecordIndex
+
+    with RecordIndex(save_path(args.split)) as record_index:
+        for offset in record_index.query(
+            entities=args.entity, relations=args.relation, ner=args.ner
+        ):
+            print(json.dumps(record_index.record(offset), ensure_ascii=False))
+
+
+def groups(args: argparse.Namespace) -> None:
+    import jsonlines as jsonl
+
+    from .index import reference_groups
+
+    for split in args.splits:
+        with jsonl.open(save_path(split)) as f:
+            split_groups = reference_groups(f)
+
+        groups_f = save_path(split).replace(".jsonl", ".groups.json")
+        with open(groups_f, "w") as f:
+            json.dump(split_groups, f)
+        print(
+            f"[Info] Saved {len(split_groups)} reference groups of"
+            f" {sum(map(len, split_groups.values()))} records into {groups_f}"
+        )
+
+
+def leakcheck(args: argparse.Namespace) -> int:
+    import jsonlines as jsonl
+
+    from .leakage import find_leaks
+
+    splits = {}
+    for split in args.splits:
+        with jsonl.open(save_path(split)) as f:
+            splits[split] = list(f)
+
+    report = find_leaks(
+        splits,
+        threshold=args.threshold,
+        num_perm=args.num_perm,
+        bands=args.bands,
+        shingle_size=args.shingle_size,
+    )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(
+        f"[Info] {len(report['exact'])} exact and {len(report['near'])}"
+        f" near-duplicate leaks between {', '.join(splits)}"
+    )
+    return 1 if report["exact"] or report["near"] else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Processing stays the default, e.g. `python -m webnlg2_reader --parallel`
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        argv = ["process"] + list(argv)
+
+    parser = argparse.ArgumentParser(
+        prog="webnlg2_reader",
+        description="Decomposes the enriched WebNLG corpus into sentence-level jsonl.",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    process_parser = commands.add_parser("process", help="process all splits")
+    add_tokenizer_arguments(process_parser)
+    add_raw_path_argument(process_parser)
+    process_parser.add_argument(
+        "--compile-templates",
+        action="store_true",
+        help="add the compiled form of every template as target_compiled",
+    )
+    process_parser.add_argument(
+        "--hash-triples",
+        action="store_true",
+        help="add a 64-bit hash of every record's triple set as triples_hash",
+    )
+    process_parser.add_argument(
+        "--align-entities",
+        action="store_true",
+        help="add the character span of every ner2ent entity in target_txt as ner2span",
+    )
+    process_parser.add_argument(
+        "--signature-index",
+        action="store_true",
+        help="also write {split}.signatures.json, a relation signature -> templates index",
+    )
+    process_parser.add_argument("--parallel", action="store_true")
+    process_parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="commit every raw file to a part file and journal it, so the run can be resumed",
+    )
+    process_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip the files journaled by an interrupted --checkpoint run",
+    )
+    process_parser.add_argument(
+        "--out-dir",
+        default=OUT_DIR,
+        help="directory to write the processed splits into (default: %(default)s)",
+    )
+    process_parser.add_argument(
+        "--quarantine",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="skip the entries that fail to read, logging them into PATH"
+        " (default: OUT_DIR/quarantine.jsonl)",
+    )
+    process_parser.add_argument(
+        "--max-quarantined",
+        type=int,
+        metavar="N",
+        help="with --quarantine, stop once more than N entries are quarantined",
+    )
+    process_parser.add_argument(
+        "--dirty-report",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="write what was dropped as dirty data, by reason and raw file, into PATH"
+        " (default: OUT_DIR/dirty_data.json)",
+    )
+    process_parser.add_argument(
+        "--sample",
+        type=int,
+        metavar="N",
+        help="only read N entries, picked at random, of every category and triple count",
+    )
+    process_parser.add_argument(
+        "--sample-seed",
+        type=int,
+        default=0,
+        help="seed of the entries picked by --sample (default: %(default)s)",
+    )
+    process_parser.add_argument(
+        "--category",
+        action="append",
+        default=[],
+        help="only read entries of this category, e.g. Airport (repeatable)",
+    )
+    process_parser.add_argument(
+        "--triples",
+        action="append",
+        type=int,
+        default=[],
+        metavar="N",
+        help="only read entries of N triples (repeatable)",
+    )
+    process_parser.add_argument(
+        "--eid",
+        action="append",
+        default=[],
+        help="only read entries of this eid, e.g. Id1, in any file (repeatable)",
+    )
+    process_parser.add_argument(
+        "--relation",
+        action="append",
+        default=[],
+        help="only read entries with a triple of this relation (repeatable)",
+    )
+    process_parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="stream files through bounded parse/read/serialize/write stages",
+    )
+    process_parser.add_argument("--parse-workers", type=int, default=2)
+    process_parser.add_argument(
+        "--parse-pool", choices=["thread", "process"], default="thread"
+    )
+    process_parser.add_argument("--serialize-workers", type=int, default=1)
+    process_parser.add_argument(
+        "--serialize-pool", choices=["thread", "process"], default="thread"
+    )
+    process_parser.add_argument(
+        "--queue-size", type=int, default=16, help="blocks waiting for the writer"
+    )
+    process_parser.add_argument(
+        "--concurrent-splits",
+        action="store_true",
+        help="process all splits in one worker pool, writing them side by side",
+    )
+    process_parser.add_argument("--executor", choices=sorted(EXECUTORS), default="ray")
+    process_parser.set_defaults(func=process)
+
+    download_parser = commands.add_parser(
+        "download", help="fetch the raw corpus into --raw-path through the local cache"
+    )
+    download_parser.add_argument("--repo", default="ThiagoCF05/webnlg")
+    download_parser.add_argument("--revision", default="711a8ca")
+    download_parser.add_argument("--version", default="v1.6")
+    download_parser.add_argument(
+        "--source",
+        help="local mirror to read instead of cloning: a checkout or archive of the repository",
+    )
+    download_parser.add_argument(
+        "--cache-dir",
+        default=CACHE_DIR,
+        help="default: $WEBNLG2_CACHE or ~/.cache/webnlg2_reader",
+    )
+    add_raw_path_argument(download_parser, versioned=False)
+    download_parser.set_defaults(func=fetch)
+
+    stats_parser = commands.add_parser("stats", help="print dataset statistics as JSON")
+    add_tokenizer_arguments(stats_parser)
+    stats_parser.add_argument(
+        "splits",
+        nargs="*",
+        default=["train", "valid", "test"],
+        help="split names or paths of processed jsonl files",
+    )
+    stats_parser.add_argument(
+        "--raw", action="store_true", help="read the raw corpus instead"
+    )
+    add_raw_path_argument(stats_parser)
+    stats_parser.add_argument("--workers", type=int, default=num_cpus)
+    stats_parser.add_argument("--executor", choices=sorted(EXECUTORS), default="fork")
+    stats_parser.add_argument("--out", help="write the JSON report to this file")
+    stats_parser.set_defaults(func=stats)
+
+    index_parser = commands.add_parser(
+        "index", help="build entity/relation/NER indexes of processed splits"
+    )
+    index_parser.add_argument("splits", nargs="*", default=["train", "valid", "test"])
+    index_parser.set_defaults(func=index)
+
+    query_parser = commands.add_parser(
+        "query", help="print the records that match every given key"
+    )
+    query_parser.add_argument("split")
+    query_parser.add_argument("--entity", action="append", default=[])
+    query_parser.add_argument("--relation", action="append", default=[])
+    query_parser.add_argument("--ner", action="append", default=[])
+    query_parser.set_defaults(func=query)
+
+    groups_parser = commands.add_parser(
+        "groups", help="group the records of processed splits by triple set"
+    )
+    groups_parser.add_argument("splits", nargs="*", default=["train", "valid", "test"])
+    groups_parser.set_defaults(func=groups)
+
+    leakcheck_parser = commands.add_parser(
+        "leakcheck", help="find records shared between processed splits"
+    )
+    leakcheck_parser.add_argument(
+        "splits", nargs="*", default=["train", "valid", "test"]
+    )
+    leakcheck_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.8,
+        help="minimum estimated Jaccard similarity of near-duplicate target_txt",
+    )
+    leakcheck_parser.add_argument("--num-perm", type=int, default=64)
+    leakcheck_parser.add_argument("--bands", type=int, default=16)
+    leakcheck_parser.add_argument(
+        "--shingle-size", type=int, default=3, help="words per shingle"
+    )
+    leakcheck_parser.add_argument("--out", help="write the JSON report to this file")
+    leakcheck_parser.set_defaults(func=leakcheck)
+
+    args = parser.parse_args(argv)
+    if args.func is process and args.pipeline and (args.checkpoint or args.resume):
+        parser.error("--checkpoint and --resume do not apply to --pipeline")
+    if args.func is process:
+        partial = [
+            option
+            for option, given in [
+                ("--sample", args.sample),
+                ("--category", args.category),
+                ("--triples", args.triples),
+                ("--eid", args.eid),
+                ("--relation", args.relation),
+            ]
+            if given
+        ]
+        if partial and os.path.normpath(args.out_dir) == os.path.normpath(OUT_DIR):
+            parser.error(
+                f"{', '.join(partial)} would overwrite the full splits in {OUT_DIR},"
+                " pick another --out-dir"
+            )
+    return args.func(args)
 
 
 if __name__ == "__main__":
+    from pyannotate_runtime import collect_types
+
     # Collect runtime type data for pyannotate
     collect_types.init_types_collection()
 
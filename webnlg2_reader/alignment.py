@@ -0,0 +1,100 @@
+"""
+Character offsets of entities in sentences. The surface forms of every
+entity of a corpus (see `entity_forms`) are compiled once into an
+`AhoCorasick` matcher, so aligning a sentence takes one scan of it.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from functools import lru_cache
+
+from .matching import AhoCorasick
+from .utils import prime_number_phrasings, rephrase, rephrase_if_must
+
+__all__ = ["EntityAligner", "entity_base", "entity_forms"]
+
+Span = Optional[List[int]]
+
+
+def entity_base(entity: str) -> str:
+    return entity.replace("_", " ").strip('"').lower()
+
+
+@lru_cache(maxsize=None)
+def entity_forms(entity: str) -> Tuple[str, ...]:
+    """The lowercased ways `entity` (e.g. `"United_States"`) may be written."""
+    forms = set()
+    for phrasing in rephrase(entity_base(entity)):
+        forms |= rephrase_if_must(phrasing)
+    return tuple(sorted(forms))
+
+
+def lower_in_place(text: str) -> str:
+    """`text.lower()`, keeping any character whose lowercase is longer as is."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+def is_word_boundary(text: str, start: int, end: int) -> bool:
+    return (start == 0 or not text[start - 1].isalnum()) and (
+        end == len(text) or not text[end].isalnum()
+    )
+
+
+class EntityAligner:
+    """
+    Finds where the entities of a record are mentioned in its `target_txt`.
+
+    Entities missing from the matcher are added on demand, but building it
+    once over the whole corpus (see `reader.corpus_entities`) avoids
+    rebuilding it along the way.
+    """
+
+    def __init__(self, entities: Iterable[str] = ()):
+        self.entities: Set[str] = set()
+        self.matcher: AhoCorasick[str] = AhoCorasick()
+        self.require(entities)
+
+    def require(self, entities: Iterable[str]) -> None:
+        """Makes sure `entities` can be aligned."""
+        missing = set(entities) - self.entities
+        if not missing:
+            return
+        prime_number_phrasings(map(entity_base, missing))
+        for entity in sorted(missing):
+            for form in entity_forms(entity):
+                self.matcher.add(form, entity)
+        self.matcher.build()
+        self.entities |= missing
+
+    def align(self, text: str, ner2ent: Dict[str, str]) -> Dict[str, Span]:
+        """
+        A `[start, end)` character span in `text` for every tag of `ner2ent`,
+        or `None` where the entity is not found.
+
+        Matches must be whole words, and spans of different entities never
+        overlap: longer matches win, then earlier ones.
+        """
+        self.require(ner2ent.values())
+        wanted = set(ner2ent.values())
+
+        hits = [
+            (start, end, entity)
+            for start, end, entity in self.matcher.finditer(lower_in_place(text))
+            if entity in wanted and is_word_boundary(text, start, end)
+        ]
+        hits.sort(key=lambda hit: (hit[0] - hit[1], hit[0]))
+
+        ent2span: Dict[str, List[int]] = {}
+        taken: List[Tuple[int, int]] = []
+        for start, end, entity in hits:
+            if entity in ent2span:
+                continue
+            if any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+            ent2span[entity] = [start, end]
+            taken.append((start, end))
+
+        return {tag: ent2span.get(ent) for tag, ent in ner2ent.items()}
@@ -0,0 +1,112 @@
+"""
+Compares tokenizer backends on the shipped data:
+
+    python -m webnlg2_reader.benchmark [--backends spacy2 spacy3 regex] [--limit N]
+
+The processed `*.jsonl` files hold the reference output of the spaCy 2
+pipeline. Every backend re-tokenizes a detokenized copy of each
+`target_txt`, and splits runs of consecutive `target_txt`s back into
+sentences. Throughput and agreement with the reference are reported per
+backend, so the fastest backend that stays correct can be picked.
+"""
+
+from typing import Dict, Iterator, List
+
+import argparse
+from glob import glob
+from itertools import islice
+from os import path
+import re
+import sys
+import time
+
+import jsonlines as jsonl
+
+from .tokenizers import BACKENDS, get_tokenizer
+
+# Sentences joined into one multi-sentence text for the sentence benchmark
+SENTENCES_PER_TEXT = 3
+
+DETOKENIZE = re.compile(
+    r" (?=[.,;:!?)\]}%]|'s\b|n't\b|'re\b|'ve\b|'ll\b|'d\b|'m\b)|(?<=[(\[{$]) "
+)
+
+
+def detokenize(text: str) -> str:
+    return DETOKENIZE.sub("", text)
+
+
+def load_sentences(data_dir: str, limit: int = None) -> List[str]:
+    def sentences() -> Iterator[str]:
+        for file_name in sorted(glob(path.join(data_dir, "*.jsonl"))):
+            with jsonl.open(file_name) as f:
+                for row in f:
+                    yield row["target_txt"]
+
+    return list(islice(sentences(), limit))
+
+
+def benchmark(tokenizer, sentences: List[str]) -> Dict[str, float]:
+    words = [detokenize(s) for s in sentences]
+    texts = [
+        sentences[i : i + SENTENCES_PER_TEXT]
+        for i in range(0, len(sentences), SENTENCES_PER_TEXT)
+    ]
+
+    start = time.perf_counter()
+    tokenized = [tokenizer.word_tokenize(s) for s in words]
+    word_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    split = [tokenizer.sent_tokenize(" ".join(t)) for t in texts]
+    sent_time = time.perf_counter() - start
+
+    return {
+        "word_per_s": len(words) / word_time,
+        "word_agreement": sum(a == b for a, b in zip(tokenized, sentences))
+        / len(sentences),
+        "sent_per_s": len(texts) / sent_time,
+        "sent_agreement": sum(a == b for a, b in zip(split, texts)) / len(texts),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--backends", nargs="+", default=sorted(BACKENDS), choices=sorted(BACKENDS)
+    )
+    parser.add_argument("--data-dir", default="./data/webnlg")
+    parser.add_argument("--limit", type=int, help="only use the first N sentences")
+    parser.add_argument(
+        "--lightweight", action="store_true", help="use spacy.blank for spaCy backends"
+    )
+    args = parser.parse_args(argv)
+
+    sentences = load_sentences(args.data_dir, args.limit)
+    print(f"[Info] Benchmarking on {len(sentences)} sentences")
+
+    print(
+        f"{'backend':<8} {'load s':>8} {'words/s':>10} {'words ok':>9}"
+        f" {'texts/s':>10} {'texts ok':>9}"
+    )
+    for backend in args.backends:
+        start = time.perf_counter()
+        try:
+            tokenizer = get_tokenizer(backend, lightweight=args.lightweight)
+        except Exception as e:
+            reason = str(e).splitlines()[0] if str(e) else ""
+            print(f"{backend:<8} skipped: {type(e).__name__}: {reason}")
+            continue
+        load_time = time.perf_counter() - start
+
+        r = benchmark(tokenizer, sentences)
+        print(
+            f"{backend:<8} {load_time:>8.2f} {r['word_per_s']:>10.0f}"
+            f" {r['word_agreement']:>9.2%} {r['sent_per_s']:>10.0f}"
+            f" {r['sent_agreement']:>9.2%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+A local cache of raw WebNLG corpora. Files are stored once under their
+SHA-256 (`objects/`), and every `(repo, revision, version)` has a manifest
+of the files it is made of (`manifests/`), so a corpus is fetched at most
+once and unchanged files are shared between revisions.
+"""
+
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from os import path
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import zipfile
+
+from .patterns.constants import DataSetType
+
+__all__ = [
+    "CACHE_DIR",
+    "RawCache",
+    "clone_files",
+    "sha256_file",
+    "source_files",
+    "verify_files",
+]
+
+CACHE_DIR = os.environ.get(
+    "WEBNLG2_CACHE", path.join(path.expanduser("~"), ".cache", "webnlg2_reader")
+)
+
+# Files are hashed in blocks of this many bytes
+BLOCK_SIZE = 1 << 20
+
+num_cpus = os.cpu_count() or 4
+
+SPLITS = [v.value for v in DataSetType]
+
+
+def sha256_file(file_name: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_files(
+    expected: Dict[str, str], num_workers: int = num_cpus
+) -> Dict[str, bool]:
+    """
+    Whether every file in `expected` exists and has the given SHA-256, hashed
+    on `num_workers` threads (hashlib releases the GIL while hashing).
+    """
+
+    def check(item: Tuple[str, str]) -> bool:
+        file_name, digest = item
+        return path.isfile(file_name) and sha256_file(file_name) == digest
+
+    with ThreadPoolExecutor(num_workers) as pool:
+        return dict(zip(expected, pool.map(check, expected.items())))
+
+
+def _write_atomic(file_name: str, write: Callable[[BinaryIO], None]) -> None:
+    os.makedirs(path.dirname(file_name), exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.dirname(file_name))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_name, file_name)
+    except BaseException:
+        os.remove(tmp_name)
+        raise
+
+
+class RawCache:
+    def __init__(self, root: str = CACHE_DIR, num_workers: int = num_cpus):
+        self.root = root
+        self.num_workers = num_workers
+
+    def object_path(self, digest: str) -> str:
+        return path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def manifest_path(self, repo: str, revision: str, version: str) -> str:
+        key = hashlib.sha256(f"{repo}\n{revision}\n{version}".encode()).hexdigest()
+        return path.join(self.root, "manifests", key[:16] + ".json")
+
+    def manifest(self, repo: str, revision: str, version: str) -> Dict[str, str]:
+        """`{relative path: SHA-256}` of a cached corpus, or `{}` if not cached."""
+        manifest_f = self.manifest_path(repo, revision, version)
+        if not path.isfile(manifest_f):
+            return {}
+        with open(manifest_f) as f:
+            return json.load(f)["files"]
+
+    def missing_objects(self, manifest: Dict[str, str]) -> List[str]:
+        """Paths in `manifest` whose object is missing or corrupt."""
+        digests = {self.object_path(d): d for d in set(manifest.values())}
+        ok = verify_files(digests, self.num_workers)
+        return [p for p, d in manifest.items() if not ok[self.object_path(d)]]
+
+    def ingest(
+        self,
+        files: Iterable[Tuple[str, BinaryIO]],
+        repo: str,
+        revision: str,
+        version: str,
+    ) -> Dict[str, str]:
+        """Stores `(relative path, file)` pairs and records their manifest."""
+        manifest = {}
+        for relpath, f in files:
+            content = f.read()
+            digest = hashlib.sha256(content).hexdigest()
+            if not path.isfile(self.object_path(digest)):
+                _write_atomic(self.object_path(digest), lambda out: out.write(content))
+            manifest[relpath] = digest
+
+        if not manifest:
+            raise ValueError(f"No files of {repo}@{revision} data/{version}/en found")
+
+        record = {
+            "repo": repo,
+            "revision": revision,
+            "version": version,
+            "files": dict(sorted(manifest.items())),
+        }
+        _write_atomic(
+            self.manifest_path(repo, revision, version),
+            lambda out: out.write(json.dumps(record, indent=2).encode()),
+        )
+        return manifest
+
+    def materialize(self, manifest: Dict[str, str], target: str) -> Tuple[int, int]:
+        """
+        Makes `target` hold exactly the files of `manifest`. Files that are
+        already there and unchanged are kept, and only the stale XML files
+        of the split directories are removed. Any other file refuses the
+        run, so that nothing but a corpus is ever touched. Returns the
+        number of files kept and copied.
+        """
+        wanted = {path.normpath(path.join(target, p)) for p in manifest}
+        stale, foreign = [], []
+        for folder, _, file_names in os.walk(target):
+            for file_name in file_names:
+                file_path = path.normpath(path.join(folder, file_name))
+                if file_path in wanted:
+                    continue
+                relpath = path.relpath(file_path, target).replace(os.sep, "/")
+                if relpath.split("/")[0] in SPLITS and relpath.endswith(".xml"):
+                    stale.append(file_path)
+                else:
+                    foreign.append(relpath)
+        if foreign:
+            raise ValueError(
+                f"{target} holds files of no corpus, e.g. {sorted(foreign)[:3]}:"
+                " move them away, or put the corpus somewhere else"
+            )
+
+        ok = verify_files(
+            {path.join(target, p): d for p, d in manifest.items()}, self.num_workers
+        )
+        copied = 0
+        for relpath, digest in manifest.items():
+            if not ok[path.join(target, relpath)]:
+                os.makedirs(path.dirname(path.join(target, relpath)), exist_ok=True)
+                shutil.copyfile(self.object_path(digest), path.join(target, relpath))
+                copied += 1
+
+        for file_path in stale:
+            os.remove(file_path)
+        return len(manifest) - copied, copied
+
+
+def source_files(source: str, version: str) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    `(relative path, file)` of every file of the English corpus in `source`:
+    a checkout or archive of the WebNLG repository (holding
+    `data/{version}/en/`), or a directory or archive of `en/` itself. A
+    directory that holds neither counts as `en/` only if the split
+    directories are right inside it.
+    """
+    prefixes = [f"data/{version}/en/", "en/"]
+
+    def relpath(name: str) -> str:
+        # The part of an archive member's name after the corpus root, if any.
+        # A bare en/ only counts outside data/, which holds other versions
+        name = "/" + name
+        ix = name.find(f"/data/{version}/en/")
+        if ix >= 0:
+            return name[ix + len(f"/data/{version}/en/") :]
+        ix = name.find("/en/")
+        if ix >= 0 and "/data/" not in name[: ix + 1]:
+            return name[ix + len("/en/") :]
+        return ""
+
+    if path.isdir(source):
+        for prefix in prefixes:
+            root = path.join(source, prefix)
+            if path.isdir(root):
+                break
+        else:
+            # A checkout without the version, or a directory of anything else
+            if path.isdir(path.join(source, "data")) or not any(
+                path.isdir(path.join(source, split)) for split in SPLITS
+            ):
+                raise ValueError(
+                    f"{source} holds neither data/{version}/en/, en/ nor the"
+                    f" {', '.join(SPLITS)} directories of an en/ corpus"
+                )
+            root = source
+        for folder, _, file_names in os.walk(root):
+            for file_name in sorted(file_names):
+                file_path = path.join(folder, file_name)
+                with open(file_path, "rb") as f:
+                    yield path.relpath(file_path, root).replace(os.sep, "/"), f
+    elif source.endswith(".zip"):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                name = relpath(info.filename)
+                if name and not info.is_dir():
+                    with archive.open(info) as f:
+                        yield name, f
+    else:
+        with tarfile.open(source, "r|*") as archive:
+            for member in archive:
+                name = relpath(member.name)
+                if name and member.isfile():
+                    yield name, archive.extractfile(member)
+
+
+def clone_files(
+    repo: str, revision: str, version: str
+) -> Iterator[Tuple[str, BinaryIO]]:
+    """Clones `repo` at `revision` into a temporary directory and reads it."""
+    with tempfile.TemporaryDirectory() as clone:
+        subprocess.run(
+            ["git", "clone", f"https://github.com/{repo}.git", clone], check=True
+        )
+        subprocess.run(["git", "checkout", revision], cwd=clone, check=True)
+        yield from source_files(clone, version)
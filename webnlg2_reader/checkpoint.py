@@ -0,0 +1,267 @@
+"""
+Checkpointed processing: every raw file is committed to a part file as soon
+as all its records are read, and recorded in a journal next to the output,
+so that a run that dies can be resumed where it stopped.
+
+For a split written to `data/webnlg/test.jsonl`, the journal is
+`test.jsonl.journal` and the part files are in `test.jsonl.parts/`. The
+parts are removed once they have been joined into `test.jsonl`, and the
+journal is kept, marked as assembled, so that resuming skips the split.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+import json
+import os
+from os import path
+import shutil
+
+from tqdm import tqdm
+
+from .dirty import DirtyDataReport
+from .filters import Filters
+from .pipeline import serialize
+from .quarantine import Quarantine
+from .reader import OUT_DIR, RAW_DIR, process_files, save_path
+from .sampling import Sample
+
+__all__ = ["Checkpoint", "save_checkpointed"]
+
+
+def _fsync_write(file_name: str, text: str, mode: str = "w") -> None:
+    with open(file_name, mode, encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class Checkpoint:
+    """
+    The journal of one split. Its first line holds the options of the run,
+    and every other line a committed file: its index and name, the number
+    of records and bytes of its part file, and what its readers dropped as
+    dirty data (see `DirtyDataReport`). Files are journaled by
+    name, and their index only orders the parts. A last line marks the
+    split as assembled, with the number of bytes of the output.
+    """
+
+    def __init__(self, save_f: str, options: dict, resume: bool = False):
+        self.save_f = save_f
+        self.journal_f = save_f + ".journal"
+        self.parts_dir = save_f + ".parts"
+        self.options = json.loads(json.dumps(options))
+        self.done: Dict[str, Dict[str, Any]] = {}
+        self.assembled = False
+
+        if not (resume and self._load()):
+            self._reset()
+
+    def _load(self) -> bool:
+        """Reads the journal back, or returns False if it cannot be resumed."""
+        if not path.isfile(self.journal_f):
+            return False
+        with open(self.journal_f, encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        try:
+            if json.loads(lines[0]) != {"options": self.options}:
+                print(f"[Info] {self.journal_f} was written with other options")
+                return False
+        except ValueError:
+            return False
+
+        # The last line may be torn: stop trusting the journal there
+        entries = []
+        for line in lines[1:]:
+            try:
+                entries.append((line, json.loads(line)))
+            except ValueError:
+                break
+
+        if entries and "assembled" in entries[-1][1]:
+            # Done, unless the output was changed or removed since
+            output_bytes = (
+                path.getsize(self.save_f) if path.isfile(self.save_f) else None
+            )
+            if output_bytes != entries[-1][1]["bytes"]:
+                return False
+            self.done = {entry["name"]: entry for _, entry in entries[:-1]}
+            self.assembled = True
+            return True
+
+        # A part may be missing or short if the run died while writing it
+        trusted = []
+        for line, entry in entries:
+            part_f = self.part_f(entry["file"])
+            if not path.isfile(part_f) or path.getsize(part_f) != entry["bytes"]:
+                break
+            self.done[entry["name"]] = entry
+            trusted.append(line + "\n")
+
+        # Drop whatever follows, so that new entries are not appended after it
+        _fsync_write(self.journal_f, lines[0] + "\n" + "".join(trusted))
+        return True
+
+    def _reset(self) -> None:
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        os.makedirs(self.parts_dir)
+        _fsync_write(self.journal_f, json.dumps({"options": self.options}) + "\n")
+
+    @property
+    def records(self) -> int:
+        return sum(entry["records"] for entry in self.done.values())
+
+    def part_f(self, file_ix: int) -> str:
+        return path.join(self.parts_dir, f"{file_ix:06d}.jsonl")
+
+    def commit(
+        self,
+        file_ix: int,
+        file_name: str,
+        rows: List[dict],
+        dirty: Dict[str, int] = None,
+    ) -> None:
+        """Writes the records of a file to its part, then journals it."""
+        text = serialize(rows)
+        part_f = self.part_f(file_ix)
+        _fsync_write(part_f + ".tmp", text)
+        os.replace(part_f + ".tmp", part_f)
+
+        entry = {
+            "file": file_ix,
+            "name": file_name,
+            "records": len(rows),
+            "bytes": path.getsize(part_f),
+            "dirty": dict(dirty or {}),
+        }
+        _fsync_write(self.journal_f, json.dumps(entry) + "\n", mode="a")
+        self.done[file_name] = entry
+
+    def assemble(self, observers: Iterable[Callable[[dict], Any]] = ()) -> int:
+        """
+        Joins the parts, in file order, into the output, calling `observers`
+        with every record, and marks the journal as assembled. Returns the
+        number of records.
+        """
+        observers = list(observers)
+        with open(self.save_f + ".tmp", "w", encoding="utf-8") as out:
+            for entry in sorted(self.done.values(), key=lambda entry: entry["file"]):
+                with open(self.part_f(entry["file"]), encoding="utf-8") as part:
+                    for line in part:
+                        out.write(line)
+                        for observer in observers:
+                            observer(json.loads(line))
+        os.replace(self.save_f + ".tmp", self.save_f)
+
+        marker = {"assembled": self.records, "bytes": path.getsize(self.save_f)}
+        _fsync_write(self.journal_f, json.dumps(marker) + "\n", mode="a")
+        self.assembled = True
+        shutil.rmtree(self.parts_dir)
+        return self.records
+
+    def replay(self, observers: Iterable[Callable[[dict], Any]] = ()) -> int:
+        """
+        Calls `observers` with every record of an assembled output, as
+        `assemble` did. Returns the number of records.
+        """
+        observers = list(observers)
+        if observers:
+            with open(self.save_f, encoding="utf-8") as f:
+                for line in f:
+                    for observer in observers:
+                        observer(json.loads(line))
+        return self.records
+
+
+def save_checkpointed(
+    data_set_types: Sequence[str],
+    parallel=True,
+    executor="ray",
+    nlp_options: dict = None,
+    reader_options: dict = None,
+    raw: str = RAW_DIR,
+    resume: bool = False,
+    observers: Dict[str, Iterable[Callable[[dict], Any]]] = None,
+    quarantine: Quarantine = None,
+    report: DirtyDataReport = None,
+    sample: Sample = None,
+    filters: Filters = None,
+    raw_version: str = None,
+    out_dir: str = OUT_DIR,
+) -> None:
+    """
+    `save_splits(process_splits(...))`, committing every raw file as it is
+    done. With `resume`, the files committed by an earlier run with the same
+    options are skipped, as are the splits it already saved, and the output
+    is byte-identical to that of an uninterrupted run. So is `report`, as
+    the dirty data counts of every file are journaled along with it.
+    """
+    observers = observers or {}
+    options = {
+        "raw": raw,
+        "raw_version": raw_version,
+        "nlp_options": nlp_options or {},
+        "reader_options": reader_options or {},
+        "sample": sample and sample.to_json(),
+        "filters": filters.to_json() if filters else None,
+    }
+    checkpoints = {
+        split: Checkpoint(save_path(split, out_dir), options, resume)
+        for split in data_set_types
+    }
+    pending = [split for split in data_set_types if not checkpoints[split].assembled]
+    skip = {split: set(checkpoints[split].done) for split in pending}
+    for split, checkpoint in checkpoints.items():
+        if checkpoint.assembled:
+            print(f"[Info] Resuming {split}: already saved into {checkpoint.save_f}")
+        elif checkpoint.done:
+            print(f"[Info] Resuming {split}: {len(checkpoint.done)} files already done")
+
+    # Counts of this run, to journal file by file
+    run_report = DirtyDataReport()
+    if report is not None:
+        for split, checkpoint in checkpoints.items():
+            for file_name, entry in checkpoint.done.items():
+                report.add(split, file_name, entry["dirty"])
+
+    def commit(key, rows):
+        split, file_ix, file_name = key
+        dirty = run_report.files.get((split, file_name))
+        checkpoints[split].commit(file_ix, file_name, rows, dirty)
+
+    # The chunks of a file come in one after the other
+    current, rows = None, []
+    processed = (
+        process_files(
+            pending,
+            parallel,
+            executor,
+            nlp_options,
+            reader_options,
+            raw,
+            skip=skip,
+            quarantine=quarantine,
+            report=run_report,
+            sample=sample,
+            filters=filters,
+            raw_version=raw_version,
+        )
+        if pending
+        else ()
+    )
+    for key, chunk_rows in tqdm(processed, desc="WebNLG", unit="chunk"):
+        if key != current and current is not None:
+            commit(current, rows)
+            rows = []
+        current = key
+        rows.extend(chunk_rows)
+    if current is not None:
+        commit(current, rows)
+    if report is not None:
+        report += run_report
+
+    for split, checkpoint in checkpoints.items():
+        if checkpoint.assembled:
+            total = checkpoint.replay(observers.get(split, ()))
+        else:
+            total = checkpoint.assemble(observers.get(split, ()))
+        print(f"[Info] Saved {total} entries into {checkpoint.save_f}")
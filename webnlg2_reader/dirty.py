@@ -0,0 +1,89 @@
+"""
+Why `RDFFileReader` dropped parts of the raw corpus. Every reader counts
+what it drops by reason, and `DirtyDataReport` gathers those counts per raw
+file across workers into a JSON report.
+"""
+
+from typing import Any, Dict, Iterable, Tuple
+
+from collections import Counter
+import json
+
+__all__ = [
+    "COREFS",
+    "COUNT_MISMATCH",
+    "DIRTY_DATA",
+    "EMPTY_SENTENCE",
+    "EMPTY_TRIPLESET",
+    "FIX_SENTENCE_REJECTED",
+    "MISSING_REFERENCES",
+    "NOT_DELEXICALIZED",
+    "REASONS",
+    "DirtyDataReport",
+]
+
+# A sentence of a sortedtripleset without any striple (the sentence is dropped)
+EMPTY_SENTENCE = "empty_sentence"
+# A lex whose sortedtripleset has no striple at all (the lex is dropped)
+EMPTY_TRIPLESET = "empty_sortedtripleset"
+# A lex without references (the lex is dropped)
+MISSING_REFERENCES = "missing_references"
+# A lex whose sentences, template sentences and triple sets do not line up
+COUNT_MISMATCH = "sentence_triple_count_mismatch"
+# A sentence left without triples, template or entities by `fix_sentence`
+FIX_SENTENCE_REJECTED = "fix_sentence_rejected"
+# A sentence whose template still mentions an entity of no triple (kept)
+NOT_DELEXICALIZED = "not_delexicalized"
+
+# What used to be `cnt_dirty_data` and `cnt_corefs`
+DIRTY_DATA = (EMPTY_SENTENCE, EMPTY_TRIPLESET, MISSING_REFERENCES, COUNT_MISMATCH)
+COREFS = (FIX_SENTENCE_REJECTED, NOT_DELEXICALIZED)
+REASONS = DIRTY_DATA + COREFS
+
+
+class DirtyDataReport:
+    """
+    Counts by reason per `(split, raw file)`. Partial reports are combined
+    with `+=`, so any split of the work gives the same report.
+    """
+
+    def __init__(self):
+        self.files: Dict[Tuple[str, str], Counter] = {}
+
+    def add(self, split: str, file_name: str, counts: Dict[str, int]) -> None:
+        counts = +Counter(counts)
+        if counts:
+            self.files.setdefault((split, file_name), Counter()).update(counts)
+
+    def __iadd__(self, other: "DirtyDataReport") -> "DirtyDataReport":
+        for (split, file_name), counts in other.files.items():
+            self.add(split, file_name, counts)
+        return self
+
+    @staticmethod
+    def _ordered(counts: Iterable[Counter]) -> Dict[str, int]:
+        total = sum(counts, Counter())
+        return {reason: total[reason] for reason in REASONS if total[reason]}
+
+    def total(self) -> Dict[str, int]:
+        return self._ordered(self.files.values())
+
+    def to_json(self) -> Dict[str, Any]:
+        splits: Dict[str, Dict[str, Counter]] = {}
+        for (split, file_name), counts in sorted(self.files.items()):
+            splits.setdefault(split, {})[file_name] = counts
+        return {
+            "total": self.total(),
+            "splits": {
+                split: {
+                    "total": self._ordered(files.values()),
+                    "files": {f: self._ordered([c]) for f, c in files.items()},
+                }
+                for split, files in splits.items()
+            },
+        }
+
+    def save(self, file_name: str) -> None:
+        with open(file_name, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2, ensure_ascii=False)
+            f.write("\n")
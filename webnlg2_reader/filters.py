@@ -0,0 +1,107 @@
+"""
+Filters pushed down to where the raw corpus is read, so that a filtered
+run costs in proportion to what it returns: raw files of other categories
+or triple counts are skipped by their path and never parsed, and other
+entries are dropped right after parsing, before anything is tokenized.
+"""
+
+from typing import Any, Dict, Iterable, List
+
+import re
+
+from .sampling import stratum
+
+__all__ = ["Filters"]
+
+TRIPLES_DIR_PATTERN = re.compile(r"(\d+)triples")
+
+
+def _category(name: str) -> str:
+    """The category of a raw file name, e.g. `Airport` for `Airport.xml`."""
+    return name[: -len(".xml")] if name.endswith(".xml") else name
+
+
+def _as_list(obj) -> list:
+    if obj is None:
+        return []
+    return obj if isinstance(obj, list) else [obj]
+
+
+class Filters:
+    """
+    Keeps the entries that match every filter given: one of `categories`
+    (e.g. `Airport` or `Airport.xml`, the name of their raw file),
+    `triple_counts`, `eids` (which repeat from file to file) and, for
+    `relations`, at least one of their triples.
+    """
+
+    def __init__(
+        self,
+        categories: Iterable[str] = (),
+        triple_counts: Iterable[int] = (),
+        eids: Iterable[str] = (),
+        relations: Iterable[str] = (),
+    ):
+        self.categories = {_category(c) for c in categories}
+        self.triple_counts = set(triple_counts)
+        self.eids = set(eids)
+        self.relations = set(relations)
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.categories or self.triple_counts or self.eids or self.relations
+        )
+
+    def to_json(self) -> Dict[str, List[Any]]:
+        return {name: sorted(values) for name, values in vars(self).items()}
+
+    def keep_file(self, file_name: str) -> bool:
+        """
+        Whether a raw file, named `{N}triples/{category}.xml`, may hold
+        entries to keep. Files named otherwise are kept, to be filtered
+        entry by entry.
+        """
+        triples_dir, _, category_f = stratum(file_name).rpartition("/")
+        if self.categories and category_f.endswith(".xml"):
+            if _category(category_f) not in self.categories:
+                return False
+        match = TRIPLES_DIR_PATTERN.fullmatch(triples_dir)
+        if self.triple_counts and match:
+            if int(match.group(1)) not in self.triple_counts:
+                return False
+        return True
+
+    def check_categories(self, file_names: Iterable[str]) -> None:
+        """
+        Raises `ValueError` if a category has no raw file among `file_names`,
+        e.g. because it is misspelled, rather than keep nothing of it.
+        """
+        found = {
+            _category(stratum(file_name).rpartition("/")[2]) for file_name in file_names
+        }
+        missing = self.categories - found
+        if missing:
+            raise ValueError(
+                f"No raw file of the categories {sorted(missing)},"
+                f" only of {sorted(found)}"
+            )
+
+    def keep_entry(self, entry: dict) -> bool:
+        """Whether an entry of a kept file is kept (see `keep_file`)."""
+        if self.eids and entry.get("@eid") not in self.eids:
+            return False
+        if self.triple_counts or self.relations:
+            tripleset = entry.get("modifiedtripleset") or {}
+            triples = _as_list(tripleset.get("mtriple"))
+            if self.triple_counts and len(triples) not in self.triple_counts:
+                return False
+            predicates = {t.split("|")[1].strip() for t in triples if t.count("|") == 2}
+            if self.relations and not predicates & self.relations:
+                return False
+        return True
+
+    def select(self, structure: dict) -> dict:
+        """A parsed raw file, with only the entries to keep."""
+        entries = structure["benchmark"]["entries"]
+        kept = [e for e in _as_list(entries and entries["entry"]) if self.keep_entry(e)]
+        return {"benchmark": {"entries": {"entry": kept} if kept else None}}
@@ -0,0 +1,255 @@
+"""
+Indexes over processed `*.jsonl` splits.
+
+`RecordIndex` maps entities, relations and NER tags to records. The index
+file holds one posting list per key: the byte offsets of the records that
+mention it, delta- and varint-encoded. It is memory-mapped, so only the
+postings of the queried keys are ever read and decoded.
+
+`SignatureIndex` maps the sorted relations of a record's triples to the
+templates written for them.
+
+`reference_groups` groups the records that share a triple set, i.e. the
+references of a multi-reference evaluation.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from array import array
+from collections import Counter, defaultdict
+import json
+import mmap
+import struct
+
+from .utils import triples_hash
+
+__all__ = [
+    "build_index",
+    "RecordIndex",
+    "record_keys",
+    "relation_signature",
+    "SignatureIndex",
+    "reference_groups",
+]
+
+MAGIC = b"WNLGIDX1"
+# magic, directory offset, directory length, number of records
+HEADER = struct.Struct("<8sQQQ")
+
+
+def record_keys(row: dict) -> Iterator[str]:
+    """The keys a record is indexed under."""
+    for subj, predi, obj in row["triples"]:
+        yield "ent:" + subj
+        yield "rel:" + predi
+        yield "ent:" + obj
+    for tag in row["ner2ent"]:
+        yield "ner:" + tag
+
+
+def _encode(values: Iterable[int]) -> bytes:
+    out = bytearray()
+    previous = 0
+    for value in values:
+        delta, previous = value - previous, value
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def _decode(data: bytes) -> List[int]:
+    values = []
+    value = shift = previous = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        values.append(previous)
+        value = shift = 0
+    return values
+
+
+def build_index(jsonl_path: str, index_path: str = None) -> str:
+    """Indexes `jsonl_path` into `index_path` (default: `<jsonl_path>.idx`)."""
+    index_path = index_path or jsonl_path + ".idx"
+
+    postings: Dict[str, array] = defaultdict(lambda: array("q"))
+    total = 0
+    with open(jsonl_path, "rb") as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                total += 1
+                for key in dict.fromkeys(record_keys(json.loads(line))):
+                    postings[key].append(offset)
+            offset += len(line)
+
+    directory: Dict[str, Tuple[int, int, int]] = {}
+    with open(index_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0, 0))
+        for key in sorted(postings):
+            encoded = _encode(postings[key])
+            directory[key] = (f.tell(), len(encoded), len(postings[key]))
+            f.write(encoded)
+
+        directory_offset = f.tell()
+        encoded = json.dumps(directory, ensure_ascii=False).encode("utf-8")
+        f.write(encoded)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, directory_offset, len(encoded), total))
+
+    return index_path
+
+
+class RecordIndex:
+    """
+    Query API over an index written by `build_index`:
+
+        index = RecordIndex("data/webnlg/test.jsonl")
+        rows = index.records(entities=["Aarhus_Airport"], relations=["location"])
+    """
+
+    def __init__(self, jsonl_path: str, index_path: str = None):
+        self._index_file = open(index_path or jsonl_path + ".idx", "rb")
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data_file = open(jsonl_path, "rb")
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, offset, length, self.size = HEADER.unpack_from(self._index)
+        if magic != MAGIC:
+            raise ValueError(f"{self._index_file.name} is not a record index")
+        self.directory = json.loads(self._index[offset : offset + length])
+
+    def close(self) -> None:
+        self._index.close()
+        self._index_file.close()
+        self._data.close()
+        self._data_file.close()
+
+    def __enter__(self) -> "RecordIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def postings(self, key: str) -> List[int]:
+        if key not in self.directory:
+            return []
+        offset, length, _ = self.directory[key]
+        return _decode(self._index[offset : offset + length])
+
+    def query(
+        self,
+        entities: Iterable[str] = (),
+        relations: Iterable[str] = (),
+        ner: Iterable[str] = (),
+    ) -> List[int]:
+        """Byte offsets of the records that match every given key."""
+        keys = (
+            ["ent:" + e for e in entities]
+            + ["rel:" + r for r in relations]
+            + ["ner:" + t for t in ner]
+        )
+        if not keys:
+            return []
+
+        # Intersect starting from the shortest list, which bounds the result
+        keys.sort(key=lambda k: self.directory.get(k, (0, 0, 0))[2])
+        result = self.postings(keys[0])
+        for key in keys[1:]:
+            if not result:
+                break
+            allowed = set(self.postings(key))
+            result = [offset for offset in result if offset in allowed]
+        return result
+
+    def record(self, offset: int) -> dict:
+        end = self._data.find(b"\n", offset)
+        return json.loads(self._data[offset : end if end >= 0 else None])
+
+    def records(self, **query) -> List[dict]:
+        return [self.record(offset) for offset in self.query(**query)]
+
+
+def relation_signature(relations: Iterable[str]) -> Tuple[str, ...]:
+    """The canonical form of a multiset of relations."""
+    return tuple(sorted(relations))
+
+
+class SignatureIndex:
+    """
+    Hash index from relation signatures to deduplicated templates.
+
+    Records are added one at a time, e.g. as an observer of `save_data`,
+    and an index loaded from disk can keep growing. Looking up the
+    templates of a signature is a single dict probe.
+    """
+
+    SEPARATOR = "\t"
+
+    def __init__(self):
+        self.templates: List[str] = []
+        self._template_ids: Dict[str, int] = {}
+        self.signatures: Dict[Tuple[str, ...], Counter] = defaultdict(Counter)
+
+    def add(self, row: dict) -> None:
+        template = row["target"]
+        template_id = self._template_ids.setdefault(template, len(self.templates))
+        if template_id == len(self.templates):
+            self.templates.append(template)
+
+        signature = relation_signature(predi for _, predi, _ in row["triples"])
+        self.signatures[signature][template_id] += 1
+
+    def template_ids(self, relations: Iterable[str]) -> List[int]:
+        """Ids of the templates for `relations`, most frequent first."""
+        counts = self.signatures.get(relation_signature(relations))
+        return [t for t, _ in counts.most_common()] if counts else []
+
+    def lookup(self, relations: Iterable[str]) -> List[str]:
+        return [self.templates[t] for t in self.template_ids(relations)]
+
+    def save(self, file_name: str) -> None:
+        with open(file_name, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "templates": self.templates,
+                    "signatures": {
+                        self.SEPARATOR.join(signature): counts
+                        for signature, counts in self.signatures.items()
+                    },
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+    @classmethod
+    def load(cls, file_name: str) -> "SignatureIndex":
+        with open(file_name, encoding="utf-8") as f:
+            obj = json.load(f)
+
+        index = cls()
+        index.templates = obj["templates"]
+        index._template_ids = {t: ix for ix, t in enumerate(index.templates)}
+        for signature, counts in obj["signatures"].items():
+            index.signatures[tuple(signature.split(cls.SEPARATOR))] = Counter(
+                {int(t): n for t, n in counts.items()}
+            )
+        return index
+
+
+def reference_groups(rows: Iterable[dict]) -> Dict[str, List[int]]:
+    """
+    Maps the triple set hash of every record to the positions of the records
+    with that triple set, in one pass. Records written with `hash_triples`
+    reuse their `triples_hash`.
+    """
+    groups: Dict[str, List[int]] = defaultdict(list)
+    for ix, row in enumerate(rows):
+        key = row.get("triples_hash") or triples_hash(row["triples"])
+        groups[key].append(ix)
+    return dict(groups)
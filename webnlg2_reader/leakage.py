@@ -0,0 +1,145 @@
+"""
+Finds records shared between the processed splits: exact duplicates of
+`(triples, target_txt)` by hashing, and near-duplicates of `target_txt` by
+MinHash LSH. Both run in time roughly linear in the number of records.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from collections import defaultdict
+from hashlib import blake2b
+from itertools import combinations, product
+import random
+import zlib
+
+from .utils import triples_hash
+
+__all__ = ["MinHasher", "exact_leaks", "near_leaks", "find_leaks"]
+
+# A record is identified by (split, line number)
+RecordId = Tuple[str, int]
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def pair_hash(row: dict) -> str:
+    key = triples_hash(row["triples"]) + "\x1d" + normalize_text(row["target_txt"])
+    return blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class MinHasher:
+    """
+    MinHash signatures of word shingles, with `num_perm` universal hash
+    functions drawn from a fixed seed so signatures are comparable across
+    runs.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.permutations = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def shingles(self, text: str) -> Set[int]:
+        words = normalize_text(text).split()
+        n = min(self.shingle_size, len(words)) or 1
+        return {
+            zlib.crc32(" ".join(words[i : i + n]).encode("utf-8"))
+            for i in range(max(len(words) - n + 1, 1))
+        }
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        shingles = self.shingles(text)
+        return tuple(
+            min((a * s + b) % MERSENNE_PRIME for s in shingles)
+            for a, b in self.permutations
+        )
+
+    @staticmethod
+    def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of the shingles behind two signatures."""
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def exact_leaks(records: Iterable[Tuple[RecordId, dict]]) -> List[List[RecordId]]:
+    """Groups of identical `(triples, target_txt)` records across splits."""
+    groups: Dict[str, List[RecordId]] = defaultdict(list)
+    for record_id, row in records:
+        groups[pair_hash(row)].append(record_id)
+
+    return [ids for ids in groups.values() if len({split for split, _ in ids}) > 1]
+
+
+def near_leaks(
+    records: Iterable[Tuple[RecordId, dict]],
+    threshold: float = 0.8,
+    num_perm: int = 64,
+    bands: int = 16,
+    shingle_size: int = 3,
+) -> List[Tuple[RecordId, RecordId, float]]:
+    """
+    Pairs of records from different splits whose `target_txt`s have an
+    estimated Jaccard similarity of at least `threshold`.
+
+    Signatures are cut into `bands` bands and only records that share a
+    band bucket are compared. More bands find more pairs below the
+    threshold, at the cost of more comparisons.
+    """
+    if num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm, shingle_size)
+
+    signatures: Dict[RecordId, Tuple[int, ...]] = {}
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[RecordId]] = defaultdict(list)
+    for record_id, row in records:
+        signature = hasher.signature(row["target_txt"])
+        signatures[record_id] = signature
+        for band in range(bands):
+            buckets[band, signature[band * rows : (band + 1) * rows]].append(record_id)
+
+    candidates = set()
+    for ids in buckets.values():
+        by_split: Dict[str, List[RecordId]] = defaultdict(list)
+        for record_id in ids:
+            by_split[record_id[0]].append(record_id)
+        for split_a, split_b in combinations(sorted(by_split), 2):
+            for a, b in product(by_split[split_a], by_split[split_b]):
+                candidates.add((a, b) if a < b else (b, a))
+
+    leaks = []
+    for a, b in sorted(candidates):
+        similarity = MinHasher.similarity(signatures[a], signatures[b])
+        if similarity >= threshold:
+            leaks.append((a, b, similarity))
+    return leaks
+
+
+def find_leaks(splits: Dict[str, List[dict]], **near_options) -> dict:
+    """A JSON report of the exact and near-duplicate leaks between `splits`."""
+
+    def records() -> Iterator[Tuple[RecordId, dict]]:
+        for split, rows in splits.items():
+            for ix, row in enumerate(rows):
+                yield (split, ix), row
+
+    exact = exact_leaks(records())
+    near = near_leaks(records(), **near_options)
+    return {
+        "exact": [[{"split": s, "line": ix} for s, ix in ids] for ids in exact],
+        "near": [
+            {
+                "a": {"split": a[0], "line": a[1]},
+                "b": {"split": b[0], "line": b[1]},
+                "similarity": similarity,
+            }
+            for a, b, similarity in near
+        ],
+    }
@@ -0,0 +1,92 @@
+from typing import Any, Dict, Generic, Iterable, Iterator, List, Tuple, TypeVar
+
+from collections import deque
+
+__all__ = ["AhoCorasick"]
+
+V = TypeVar("V")
+
+
+class AhoCorasick(Generic[V]):
+    """
+    A multi-pattern matcher: finds every occurrence of every pattern in a
+    text in one left-to-right scan, however many patterns there are.
+
+    Each pattern carries a value, which is what matches report back, so that
+    several patterns can stand for the same thing (e.g. the surface forms of
+    one entity).
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, V]] = ()):
+        # A trie as one transition dict per node, with node 0 as the root
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, V]]] = [[]]
+        for pattern, value in patterns:
+            self.add(pattern, value)
+        self.build()
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def add(self, pattern: str, value: V) -> None:
+        """Adds a pattern. `build` must be called before matching again."""
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        self._out[node].append((len(pattern), value))
+
+    def build(self) -> None:
+        """Computes the failure links, breadth first from the root."""
+        queue = deque(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+        # Dictionary suffix links: matches ending at a node's suffixes, so
+        # that scanning never has to walk the failure chain for output
+        self._suffix_out: List[List[Tuple[int, V]]] = [[] for _ in self._goto]
+        for node in self._bfs_order():
+            self._suffix_out[node] = self._out[node] + (
+                self._suffix_out[self._fail[node]] if node else []
+            )
+
+    def _bfs_order(self) -> Iterator[int]:
+        queue = deque([0])
+        while queue:
+            node = queue.popleft()
+            yield node
+            queue.extend(self._goto[node].values())
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, V]]:
+        """Yields `(start, end, value)` for every, possibly overlapping, match."""
+        goto, fail, out = self._goto, self._fail, self._suffix_out
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, value in out[node]:
+                yield end - length, end, value
+
+    def values_in(self, text: str) -> List[V]:
+        """The distinct values of the patterns occurring in `text`, by first match."""
+        seen: Dict[Any, None] = {}
+        for _, _, value in self.finditer(text):
+            seen.setdefault(value)
+        return list(seen)
@@ -0,0 +1,100 @@
+"""
+Checks that `RegexSentenceSplitter` splits the raw corpus exactly like
+spaCy's sentencizer followed by `fix_tokenize`:
+
+    python -m webnlg2_reader.parity [--raw-path RAW] [--out disagreements.jsonl] [test train dev]
+
+Exits with status 1 if any text or template is split differently.
+"""
+
+from typing import Iterator, List, Tuple
+
+import argparse
+import sys
+
+import jsonlines as jsonl
+
+from . import add_raw_path_argument
+from .patterns.constants import DataSetType
+from .reader import RAW_DIR, RDFFileReader, parse_xml_source, raw_sources
+from .tokenizers import Tokenizer, get_tokenizer
+from .utils import fix_tokenize
+
+
+def lex_strings(
+    data_set_type: str, nlp: Tokenizer, raw: str = RAW_DIR, raw_version: str = None
+) -> Iterator[Tuple[str, str, str, str]]:
+    """
+    Yields (file, eid, kind, string) for every template and text in a split
+    of `raw` (see `read_raw`), tokenized the way `RDFFileReader` tokenizes
+    them before splitting.
+    """
+    for file_name, source in raw_sources(data_set_type, raw, raw_version):
+        structure = parse_xml_source(source)
+        entries = RDFFileReader._triples_from_obj(
+            structure["benchmark"]["entries"], "entry"
+        )
+        for entry in entries:
+            lexes = entry["lex"] if isinstance(entry["lex"], list) else [entry["lex"]]
+            for lex in lexes:
+                template = RDFFileReader.fix_template_words(lex["template"])
+                if template:
+                    yield file_name, entry["@eid"], "template", nlp.word_tokenize(
+                        template
+                    )
+                if lex["text"]:
+                    yield file_name, entry["@eid"], "text", nlp.word_tokenize(
+                        lex["text"]
+                    )
+
+
+def split(nlp: Tokenizer, kind: str, string: str) -> List[str]:
+    sentences = nlp.sent_tokenize(string)
+    return fix_tokenize(sentences) if kind == "text" else sentences
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("splits", nargs="*", default=[v.value for v in DataSetType])
+    add_raw_path_argument(parser)
+    parser.add_argument("--out", help="write disagreements to this jsonl file")
+    parser.add_argument("--show", type=int, default=10, help="disagreements to print")
+    args = parser.parse_args(argv)
+
+    spacy_nlp = get_tokenizer("spacy", lightweight=True)
+    regex_nlp = get_tokenizer("spacy", lightweight=True, sentencizer="regex")
+
+    total, disagreements = 0, []
+    for data_set_type in args.splits:
+        for file_name, eid, kind, string in lex_strings(
+            data_set_type, spacy_nlp, args.raw_path, args.raw_version
+        ):
+            total += 1
+            expected = split(spacy_nlp, kind, string)
+            actual = split(regex_nlp, kind, string)
+            if expected != actual:
+                disagreements.append(
+                    {
+                        "file": file_name,
+                        "eid": eid,
+                        "kind": kind,
+                        "spacy": expected,
+                        "regex": actual,
+                    }
+                )
+
+    for d in disagreements[: args.show]:
+        print(f"[Diff] {d['file']} {d['eid']} ({d['kind']})")
+        print(f"  spacy: {d['spacy']}")
+        print(f"  regex: {d['regex']}")
+
+    if args.out:
+        with jsonl.open(args.out, "w") as f:
+            f.write_all(disagreements)
+
+    print(f"[Info] {len(disagreements)} of {total} strings split differently")
+    return 1 if disagreements else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
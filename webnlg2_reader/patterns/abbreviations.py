@@ -0,0 +1,30 @@
+__all__ = ["abbreviations", "sentence_final_abbreviations"]
+
+# Collected from the merges in `fix_tokenize`: the sentencizer wrongly ends a
+# sentence after these, e.g. "graduated from MIT with a Sc. D in 1963."
+abbreviations = {
+    "Sc.",
+    "St.",
+    "Dr.",
+    "Blvd.",
+    "opp.",
+    "abbr.",
+    "Palaeontol.",
+}
+
+# Collected from the splits in `fix_tokenize`: the tokenizer keeps the final
+# period attached to these, so the sentencizer misses the sentence end, e.g.
+# "graduated from UT Austin with a B.S. He went on to ..."
+sentence_final_abbreviations = {
+    "A/S.",
+    "B.S.",
+    "D.C.",
+    "F.C.",
+    "Jr.",
+    "M.A.",
+    "M.S.",
+    "Pa.",
+    "S.S.",
+    "U.S.",
+    "U.S.A.",
+}
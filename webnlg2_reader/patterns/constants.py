@@ -1,6 +1,6 @@
 from enum import Enum
 
-__all__ = ["ALPHA", "OMEGA", "SPLITABLES", "DataSetType"]
+__all__ = ["ALPHA", "OMEGA", "SPLITABLES", "SENTENCE_PUNCT", "DataSetType"]
 
 ALPHA = chr(2)  # Start of text
 OMEGA = chr(3)  # End of text
@@ -22,6 +22,11 @@ SPLITABLES = {
     '"',
 }
 
+# Characters after which spaCy's rule-based sentencizer ends a sentence
+SENTENCE_PUNCT = set(
+    "!.?։؟۔܀܁܂߹।॥၊။።፧፨᙮᜵᜶᠃᠉᥄᥅᪨᪩᪪᪫᭚᭛᭞᭟᰻᰼᱾᱿‼‽⁇⁈⁉⸮⸼꓿꘎꘏꛳꛷꡶꡷꣎꣏꤯꧈꧉꩝꩞꩟꫰꫱꯫﹒﹖﹗！．？𐩖𐩗𑁇𑁈𑂾𑂿𑃀𑃁𑅁𑅂𑅃𑇅𑇆𑇍𑇞𑇟𑈸𑈹𑈻𑈼𑊩𑑋𑑌𑗂𑗃𑗉𑗊𑗋𑗌𑗍𑗎𑗏𑗐𑗑𑗒𑗓𑗔𑗕𑗖𑗗𑙁𑙂𑜼𑜽𑜾𑩂𑩃𑪛𑪜𑱁𑱂𖩮𖩯𖫵𖬷𖬸𖭄𛲟𝪈｡。"
+)
+
 
 class DataSetType(Enum):
     TEST = "test"
@@ -0,0 +1,35 @@
+__all__ = ["units"]
+
+# How numbers with a unit, e.g. "1.5 (kilometres)", may be written. "short"
+# is appended both with and without a space ("1.5 km", "1.5km"), and every
+# word with a space; "words" defaults to the unit itself.
+units = {
+    "metres": {"short": "m", "words": ["metres", "meters"]},
+    "millimetres": {"short": "mm"},
+    "centimetres": {"short": "cm"},
+    "kilometres": {"short": "km"},
+    "kilograms": {"short": "kg"},
+    "litres": {"short": "l"},
+    "inches": {"short": "''"},
+    "degreecelsius": {"words": ["degrees celsius"]},
+    "degreeklsius": {"words": ["degrees celsius"]},
+    "grampercubiccentimetres": {"words": ["grams per cubic centimetre"]},
+    "kilometreperseconds": {
+        "words": [
+            "kilometres per second",
+            "km/s",
+            "km/sec",
+            "km per second",
+            "km per sec",
+        ]
+    },
+    "squarekilometres": {"words": ["square kilometres", "sq km"]},
+    "square kilometres": {"words": ["square kilometres", "sq km"]},
+    "cubiccentimetres": {"short": "cc", "words": ["cubic centimetres"]},
+    "cubic inches": {},
+    "days": {},
+    "tonnes": {},
+    "square metres": {},
+    "inhabitants per square kilometre": {},
+    "kelvins": {},
+}
@@ -0,0 +1,243 @@
+"""
+`process_splits` and `save_splits` as a streaming pipeline, for corpora that
+should never be held in memory whole:
+
+    discover -> parse -> read -> serialize -> write
+
+Files are discovered lazily, parsed on a pool of threads (or processes),
+read by `RDFFileReader`s on the usual worker pool (see `map_chunks`),
+serialized on a pool of threads (or processes) and written by a writer
+thread. Every stage only runs a bounded number of items ahead of the next
+one, so the number of files, chunks and serialized blocks in memory is
+capped whatever the size of the corpus.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+import io
+import queue
+import threading
+
+import jsonlines as jsonl
+
+from .dirty import DirtyDataReport
+from .filters import Filters
+from .quarantine import Quarantine
+from .reader import (
+    OUT_DIR,
+    PENDING_PER_SHARD,
+    RAW_DIR,
+    alignment_entities,
+    gather_ordered,
+    map_chunks,
+    num_cpus,
+    parse_raw_file,
+    raw_sources,
+    read_results,
+    record_dropped,
+    save_path,
+    split_entries,
+)
+from .sampling import Sample
+from .utils import report_unknown_units
+
+__all__ = ["Pipeline"]
+
+POOLS: Dict[str, Callable[[int], Executor]] = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
+def serialize(rows: List[dict]) -> str:
+    """`rows` as the lines `jsonlines` would write for them."""
+    buffer = io.StringIO()
+    jsonl.Writer(buffer).write_all(rows)
+    return buffer.getvalue()
+
+
+class Pipeline:
+    """
+    Options of every stage. Each pool keeps at most `pending` items per
+    worker in flight, and the writer queue holds at most `queue_size`
+    blocks.
+
+    With `align_entities`, the raw files are parsed twice: a first pass
+    gathers the entities of the corpus, so that every worker builds its
+    entity matcher once, up front, rather than on every chunk that brings
+    new entities.
+    With a `quarantine`, entries that fail to read are handed to it instead
+    of stopping the run. What is dropped as dirty data is counted into
+    `report`, if given. With a `sample`, only its entries of every raw file
+    are parsed, and only the entries matching `filters`, if given.
+    """
+
+    def __init__(
+        self,
+        executor: str = "ray",
+        num_shards: int = num_cpus,
+        parse_workers: int = 2,
+        parse_pool: str = "thread",
+        serialize_workers: int = 1,
+        serialize_pool: str = "thread",
+        pending: int = PENDING_PER_SHARD,
+        queue_size: int = 16,
+        nlp_options: dict = None,
+        reader_options: dict = None,
+        raw: str = RAW_DIR,
+        quarantine: Quarantine = None,
+        report: DirtyDataReport = None,
+        sample: Sample = None,
+        filters: Filters = None,
+        raw_version: str = None,
+    ):
+        self.executor = executor
+        self.num_shards = num_shards
+        self.parse_workers = parse_workers
+        self.parse_pool = parse_pool
+        self.serialize_workers = serialize_workers
+        self.serialize_pool = serialize_pool
+        self.pending = pending
+        self.queue_size = queue_size
+        self.nlp_options = nlp_options or {}
+        self.reader_options = reader_options or {}
+        self.raw = raw
+        self.raw_version = raw_version
+        self.quarantine = quarantine
+        self.report = report
+        self.sample = sample
+        self.filters = filters
+        self.file_names: Dict[Tuple[str, int], str] = {}
+
+    def discover(self, data_set_types: Sequence[str]) -> Iterator[Tuple[Any, Any]]:
+        for split in data_set_types:
+            for file_ix, (file_name, source) in enumerate(
+                raw_sources(split, self.raw, self.raw_version)
+            ):
+                if self.filters and not self.filters.keep_file(file_name):
+                    continue
+                self.file_names[split, file_ix] = file_name
+                yield (split, file_ix), source
+
+    def parse_files(self, sources, pool: Executor) -> Iterator[Tuple[Any, dict]]:
+        """Parsed files, keyed by (split, file)."""
+        return gather_ordered(
+            sources,
+            submit=lambda key, source: (
+                key,
+                pool.submit(
+                    parse_raw_file,
+                    key[0],
+                    self.file_names[key],
+                    source,
+                    self.sample,
+                    self.filters,
+                ),
+            ),
+            get=lambda item: (item[0], item[1].result()),
+            max_pending=self.parse_workers * self.pending,
+        )
+
+    def parse(self, sources, pool: Executor) -> Iterator[Tuple[Any, dict]]:
+        """Parsed files, split into chunks keyed by (split, file, entry)."""
+        for (split, file_ix), structure in self.parse_files(sources, pool):
+            for (_, entry_ix), chunk in split_entries([structure]):
+                yield (split, file_ix, entry_ix), chunk
+
+    def read(
+        self, chunks, entities: Sequence[str] = ()
+    ) -> Iterator[Tuple[Any, List[dict]]]:
+        for key, (rows, quarantined, dirty) in map_chunks(
+            chunks,
+            self.executor,
+            self.num_shards,
+            self.nlp_options,
+            dict(self.reader_options, quarantine=self.quarantine is not None),
+            task=read_results,
+            entities=entities,
+        ):
+            file_name = self.file_names[key[0], key[1]]
+            record_dropped(
+                key[0], file_name, quarantined, dirty, self.quarantine, self.report
+            )
+            yield key, rows
+
+    def serialize(
+        self, chunks, pool: Executor
+    ) -> Iterator[Tuple[str, List[dict], str]]:
+        serialized = gather_ordered(
+            chunks,
+            submit=lambda key, rows: (key, rows, pool.submit(serialize, rows)),
+            get=lambda item: (item[0][0], item[1], item[2].result()),
+            max_pending=self.serialize_workers * self.pending,
+        )
+        yield from serialized
+
+    def run(
+        self,
+        data_set_types: Sequence[str],
+        observers: Dict[str, Iterable[Callable[[dict], Any]]] = None,
+        out_dir: str = OUT_DIR,
+    ) -> Dict[str, int]:
+        """
+        Processes `data_set_types` into `{out_dir}/{split}.jsonl`, exactly
+        like `save_splits(process_splits(...))`, and returns the number of
+        records written per split.
+        """
+        observers = observers or {}
+        save_fs = {split: save_path(split, out_dir) for split in data_set_types}
+        totals = dict.fromkeys(data_set_types, 0)
+        blocks: queue.Queue = queue.Queue(self.queue_size)
+        failure = []
+
+        def write():
+            try:
+                with ExitStack() as stack:
+                    files = {
+                        split: stack.enter_context(open(save_f, "w", encoding="utf-8"))
+                        for split, save_f in save_fs.items()
+                    }
+                    for split, rows, text in iter(blocks.get, None):
+                        totals[split] += len(rows)
+                        for observer in observers.get(split, ()):
+                            for row in rows:
+                                observer(row)
+                        files[split].write(text)
+            except BaseException as e:
+                failure.append(e)
+                # Keep draining, so that the producer never blocks forever
+                for _ in iter(blocks.get, None):
+                    pass
+
+        # Started with the first block, once the worker pool has been forked
+        writer = threading.Thread(target=write, name="webnlg-writer")
+        try:
+            with POOLS[self.parse_pool](self.parse_workers) as parse_pool, POOLS[
+                self.serialize_pool
+            ](self.serialize_workers) as serialize_pool:
+                entities = []
+                if self.reader_options.get("align_entities"):
+                    files = self.parse_files(self.discover(data_set_types), parse_pool)
+                    entities = alignment_entities(x for _, x in files)
+                chunks = self.parse(self.discover(data_set_types), parse_pool)
+                rows = self.read(chunks, entities)
+                for block in self.serialize(rows, serialize_pool):
+                    if writer.ident is None:
+                        writer.start()
+                    if failure:
+                        break
+                    blocks.put(block)
+        finally:
+            if writer.ident is None:
+                writer.start()
+            blocks.put(None)
+            writer.join()
+        if failure:
+            raise failure[0]
+
+        report_unknown_units()
+        for split, save_f in save_fs.items():
+            print(f"[Info] Saved {totals[split]} entries into {save_f}")
+        return totals
@@ -0,0 +1,91 @@
+"""
+Entries that fail to read, set aside instead of stopping the run. Readers
+created with `quarantine=True` skip such entries; their file, `@eid` and
+exception end up in a side file, one JSON object per line.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from collections import Counter
+import json
+import os
+
+__all__ = ["Quarantine", "QuarantineLimitExceeded"]
+
+
+class QuarantineLimitExceeded(RuntimeError):
+    pass
+
+
+class Quarantine:
+    """
+    Writes quarantined entries to `path` as they come in. More than
+    `max_entries` of them (if given) stops the run with
+    `QuarantineLimitExceeded`. With `append`, the entries of an earlier run,
+    e.g. one being resumed, are kept and counted, and entries it already
+    quarantined are not written again.
+    """
+
+    def __init__(
+        self, path: str, max_entries: Optional[int] = None, append: bool = False
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.exceptions: Counter = Counter()
+        self.files: Counter = Counter()
+        self.seen: Set[Tuple[str, str, str]] = set()
+        kept = []
+        if append and os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        # Torn by a run that died while writing it
+                        break
+                    record = json.loads(line)
+                    self._count(record["split"], record["file"], record)
+                    kept.append(line)
+        self._f = open(path, "w", encoding="utf-8")
+        self._f.writelines(kept)
+
+    def __enter__(self) -> "Quarantine":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._f.close()
+
+    @property
+    def total(self) -> int:
+        return sum(self.exceptions.values())
+
+    def _count(self, split: str, file_name: str, entry: Dict[str, str]) -> bool:
+        """Counts an entry, or returns False if it was already counted."""
+        key = (split, file_name, entry["eid"])
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.exceptions[entry["exception"].split(":", 1)[0]] += 1
+        self.files[file_name] += 1
+        return True
+
+    def add(self, split: str, file_name: str, entries: List[Dict[str, str]]) -> None:
+        for entry in entries:
+            if self._count(split, file_name, entry):
+                record = {"split": split, "file": file_name, **entry}
+                self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+        if self.max_entries is not None and self.total > self.max_entries:
+            raise QuarantineLimitExceeded(
+                f"More than {self.max_entries} entries quarantined, see {self.path}"
+            )
+
+    def summary(self) -> str:
+        if not self.total:
+            return "[Info] No entries quarantined"
+        return (
+            f"[Info] Quarantined {self.total} entries from {len(self.files)} files"
+            f" into {self.path}: {dict(self.exceptions.most_common())}"
+        )
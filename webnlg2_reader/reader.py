@@ -1,18 +1,44 @@
-from typing import List
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
+import gc
+import multiprocessing
 import os
 import sys
-from itertools import chain
+import tarfile
+import zipfile
+from itertools import chain, cycle
 from os import path
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
 
 import jsonlines as jsonl
-from ray.util import iter as pariter
+import ray
 from tqdm import tqdm
 import xmltodict
 
 num_cpus = os.cpu_count() or 4
 
+# Where `download` puts the raw corpus, one directory per split
+RAW_DIR = "./data/webnlg/raw"
+# Where the processed splits are written, e.g. `valid.jsonl` for dev
+OUT_DIR = "./data/webnlg"
+
+# Entries per parallel work item, and how many work items may be in flight
+# or waiting in the reorder buffer (per shard) at any time
+CHUNK_SIZE = 64
+PENDING_PER_SHARD = 4
+
 from .utils import (
     Cleaner,
     misspelling,
@@ -20,16 +46,63 @@ from .utils import (
     rephrase_if_must,
     fix_tokenize,
     fix_template_word,
-    NLP,
     shell,
     flatten_list,
-    show_var,
     fwrite,
+    prime_number_phrasings,
+    triples_hash,
+    report_unknown_units,
+)
+
+from .alignment import EntityAligner, entity_base
+from .cache import CACHE_DIR, RawCache, clone_files, source_files
+from .dirty import (
+    COREFS,
+    COUNT_MISMATCH,
+    DIRTY_DATA,
+    EMPTY_SENTENCE,
+    EMPTY_TRIPLESET,
+    FIX_SENTENCE_REJECTED,
+    MISSING_REFERENCES,
+    NOT_DELEXICALIZED,
+    DirtyDataReport,
 )
+from .filters import Filters
+from .quarantine import Quarantine
+from .sampling import Sample
+from .templates import CompiledTemplate, tag_pattern
+from .tokenizers import Tokenizer, get_tokenizer
 
-nlp = NLP()
 cleaner = Cleaner()
 
+# Loaded on first use, so that importing the module stays cheap and every
+# worker process holds exactly one copy of the model
+_nlp = None
+_aligner = None
+
+
+def get_nlp(**options) -> Tokenizer:
+    """
+    Returns this process' tokenizer, creating it with `options` (see
+    `get_tokenizer`) on first use.
+    """
+    global _nlp
+    if _nlp is None:
+        _nlp = get_tokenizer(**options)
+    return _nlp
+
+
+def get_aligner(entities: Iterable[str] = ()) -> EntityAligner:
+    """
+    Returns this process' entity aligner, making sure it covers `entities`.
+    """
+    global _aligner
+    if _aligner is None:
+        _aligner = EntityAligner(entities)
+    else:
+        _aligner.require(entities)
+    return _aligner
+
 
 def parse_xml_file(file_name):
     with open(file_name, encoding="utf-8") as f:
@@ -38,48 +111,242 @@ def parse_xml_file(file_name):
     structure = xmltodict.parse(content)
     return structure
 
+
+def is_archive(raw: str) -> bool:
+    return raw.endswith((".tar", ".tar.gz", ".tgz", ".zip"))
+
+
+def read_raw(
+    data_set_type: str, raw: str = RAW_DIR, version: str = None
+) -> Iterator[dict]:
+    """
+    Parses every XML file of a split of the raw corpus, one at a time.
+
+    `raw` is either a directory holding one directory per split, or a
+    `.tar`/`.tar.gz`/`.zip` archive holding such a directory anywhere
+    inside it, e.g. an archive of the WebNLG repository. Archive members
+    are parsed straight from the archive, in archive order, without
+    extracting them.
+
+    A checkout or archive of the repository holds a corpus per version:
+    with `version`, only the one in `data/{version}/en/` is read.
+    """
+    for _, source in raw_sources(data_set_type, raw, version):
+        yield parse_xml_source(source)
+
+
+def raw_sources(
+    data_set_type: str, raw: str = RAW_DIR, version: str = None
+) -> Iterator[Tuple[str, Union[str, bytes]]]:
+    """
+    `(name, source)` of the XML files of a split (see `read_raw`). Sources
+    are paths when `raw` is a directory, or contents when it is an archive.
+    """
+    if not is_archive(raw):
+        corpus_root = f"data/{version}/en" if version else ""
+        split_dir = path.join(raw, corpus_root, data_set_type)
+        for file_name in recurse_files(split_dir):
+            yield file_name, file_name
+        return
+
+    found = False
+    for name, source in archive_members(
+        raw, split_member_filter(raw, data_set_type, version)
+    ):
+        found = True
+        yield name, source
+    if not found:
+        raise no_split_files(raw, data_set_type, version)
+
+
+def raw_file_names(
+    data_set_types: Sequence[str], raw: str = RAW_DIR, version: str = None
+) -> Dict[str, List[str]]:
+    """
+    The names of the XML files of every split (see `raw_sources`), listing
+    an archive once for all of them rather than once per split.
+    """
+    if not is_archive(raw):
+        return {
+            split: [name for name, _ in raw_sources(split, raw, version)]
+            for split in data_set_types
+        }
+
+    in_splits = {
+        split: split_member_filter(raw, split, version) for split in data_set_types
+    }
+    names = {split: [] for split in data_set_types}
+    for name, _ in archive_members(raw, lambda name: True, read=False):
+        for split, in_split in in_splits.items():
+            if in_split(name):
+                names[split].append(name)
+    for split, split_names in names.items():
+        if not split_names:
+            raise no_split_files(raw, split, version)
+    return names
+
+
+def split_member_filter(
+    raw: str, data_set_type: str, version: str = None
+) -> Callable[[str], bool]:
+    """
+    Whether a member of the archive `raw` is an XML file of a split, which
+    must sit in a single directory, the one of `version` if given.
+    """
+    corpus_root = f"data/{version}/en" if version else ""
+    roots = set()
+
+    def in_split(name: str) -> bool:
+        parts = name.split("/")
+        if not name.endswith(".xml") or data_set_type not in parts[:-1]:
+            return False
+        root = "/".join(parts[: parts.index(data_set_type)])
+        if corpus_root and not ("/" + root).endswith("/" + corpus_root):
+            return False
+        roots.add(root)
+        if len(roots) > 1:
+            raise ValueError(
+                f"{raw} holds more than one {data_set_type} directory:"
+                f" {sorted(roots)}, pick the one in data/{{version}}/en/ by version"
+            )
+        return True
+
+    return in_split
+
+
+def no_split_files(raw: str, data_set_type: str, version: str = None) -> ValueError:
+    split_dir = f"data/{version}/en/{data_set_type}" if version else data_set_type
+    return ValueError(f"{raw} holds no XML files under a {split_dir} directory")
+
+
+def archive_members(
+    raw: str, keep: Callable[[str], bool], read: bool = True
+) -> Iterator[Tuple[str, Union[bytes, None]]]:
+    """
+    `(name, content)` of the files of the archive `raw` that `keep`, in a
+    single pass over it. Contents are None unless `read`.
+    """
+    if raw.endswith(".zip"):
+        with zipfile.ZipFile(raw) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and keep(info.filename):
+                    yield info.filename, archive.read(info) if read else None
+    else:
+        # A stream, so that compressed archives are read in a single pass
+        with tarfile.open(raw, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and keep(member.name):
+                    source = archive.extractfile(member).read() if read else None
+                    yield member.name, source
+
+
+def parse_xml_source(source: Union[str, bytes]) -> dict:
+    """Parses a file from `raw_sources`."""
+    if isinstance(source, bytes):
+        return xmltodict.parse(source)
+    return parse_xml_file(source)
+
+
+def parse_raw_file(
+    split: str,
+    file_name: str,
+    source: Union[str, bytes],
+    sample: Sample = None,
+    filters: Filters = None,
+) -> dict:
+    """
+    Parses a file from `raw_sources`, or only its entries in `sample`, and
+    drops the entries out of `filters`.
+    """
+    keep = filters.keep_entry if filters else None
+    if sample is not None:
+        return sample.parse(split, file_name, source, keep)
+    structure = parse_xml_source(source)
+    return filters.select(structure) if keep else structure
+
+
 class RDFFileReader:
-    def __init__(self, structure, verbose=False):
+    def __init__(
+        self,
+        structure,
+        verbose=False,
+        nlp=None,
+        compile_templates=False,
+        hash_triples=False,
+        align_entities=False,
+        aligner=None,
+        quarantine=False,
+    ):
         self.data = []
+        # Entries that raised, with quarantine on: {"eid", "exception"}
+        self.quarantined = []
+        self.compile_templates = compile_templates
+        self.hash_triples = hash_triples
+        self.nlp = nlp or get_nlp()
+        self.aligner = (aligner or get_aligner()) if align_entities else None
+        if self.aligner:
+            # A no-op when the matcher was built over the whole corpus
+            self.aligner.require(corpus_entities([structure]))
 
-        self.cnt_dirty_data = 0
-        self.cnt_corefs = 0
+        # What was dropped, by reason (see `dirty.REASONS`)
+        self.dirty = Counter()
 
-        for entry_ix, entry in enumerate(
-            self._triples_from_obj(structure["benchmark"]["entries"], "entry"),
-        ):
-            self.entry_ix = entry["@eid"]
+        for entry in self._triples_from_obj(structure["benchmark"]["entries"], "entry"):
+            n_rows, dirty = len(self.data), self.dirty.copy()
+            try:
+                self.read_entry(entry)
+            except Exception as e:
+                if not quarantine:
+                    raise
+                # Drop the records and counts of the entry read before it failed
+                del self.data[n_rows:]
+                self.dirty = dirty
+                self.quarantined.append(
+                    {"eid": entry.get("@eid"), "exception": f"{type(e).__name__}: {e}"}
+                )
+        if verbose and self.dirty:
+            print(f"[Info] Dropped: {dict(self.dirty)}")
+
+    @property
+    def cnt_dirty_data(self) -> int:
+        return sum(self.dirty[reason] for reason in DIRTY_DATA)
+
+    @property
+    def cnt_corefs(self) -> int:
+        return sum(self.dirty[reason] for reason in COREFS)
 
-            triplets = [
-                tuple(map(str.strip, r.split("|")))
-                for r in self._triples_from_obj(entry["modifiedtripleset"], "mtriple")
+    def read_entry(self, entry):
+        self.entry_ix = entry["@eid"]
+
+        triplets = [
+            tuple(map(str.strip, r.split("|")))
+            for r in self._triples_from_obj(entry["modifiedtripleset"], "mtriple")
+        ]
+
+        entitymaps = dict(
+            [
+                tuple(map(str.strip, entitymap.split("|")))
+                for entitymap in self._triples_from_obj(entry["entitymap"], "entity")
             ]
+        )
 
-            entitymaps = dict(
-                [
-                    tuple(map(str.strip, entitymap.split("|")))
-                    for entitymap in self._triples_from_obj(
-                        entry["entitymap"], "entity"
-                    )
-                ]
-            )
+        sentences = list(self.extract_sentences(entry["lex"]))
 
-            sentences = list(self.extract_sentences(entry["lex"]))
-
-            for s_tripleset, text, template, ner2ent in sentences:
-                self.data.append(
-                    {
-                        # 'rdfs': triplets,
-                        "triples": s_tripleset,
-                        "target": template,
-                        "target_txt": text,
-                        "ner2ent": ner2ent,
-                    }
-                )
-        if verbose and self.cnt_dirty_data:
-            show_var(["self.cnt_dirty_data"])
-        if verbose and self.cnt_corefs:
-            show_var(["self.cnt_corefs"])
+        for s_tripleset, text, template, ner2ent in sentences:
+            row = {
+                # 'rdfs': triplets,
+                "triples": s_tripleset,
+                "target": str(template),
+                "target_txt": text,
+                "ner2ent": ner2ent,
+            }
+            if self.compile_templates:
+                row["target_compiled"] = template.to_json()
+            if self.hash_triples:
+                row["triples_hash"] = triples_hash(s_tripleset)
+            if self.aligner:
+                row["ner2span"] = self.aligner.align(text, ner2ent)
+            self.data.append(row)
 
     @staticmethod
     def _triples_from_obj(obj, t_name):
@@ -131,29 +398,26 @@ class RDFFileReader:
                 template = [template]
                 text = [text]
             else:
-                template = nlp.sent_tokenize(template)
-                text = nlp.sent_tokenize(text)
+                template = self.nlp.sent_tokenize(template)
+                text = self.nlp.sent_tokenize(text)
                 text = fix_tokenize(text)
 
             if len({len(template), len(text), len(s_tripleset)}) != 1:
-                # import pdb;
-                # pdb.set_trace()
-                self.cnt_dirty_data += 1
+                self.dirty[COUNT_MISMATCH] += 1
                 continue
 
             for s_t, tex, tem in zip(s_tripleset, text, template):
 
                 new_s_t, tem, uniq_tag2ent = self.fix_sentence(s_t, tem, tag2ent)
                 if not (new_s_t and tem and tex and uniq_tag2ent):
-                    self.cnt_corefs += 1
-                    # import pdb;pdb.set_trace()
+                    self.dirty[FIX_SENTENCE_REJECTED] += 1
                     continue
 
                 yield new_s_t, tex, tem, uniq_tag2ent
 
-    def fix_document(self, s_tripleset_raw, template, text, tag2ent):
-        # check template
-        template = (
+    @staticmethod
+    def fix_template_words(template):
+        return (
             " ".join(
                 [
                     fix_template_word[word] if word in fix_template_word else word
@@ -164,16 +428,23 @@ class RDFFileReader:
             else template
         )
 
+    def fix_document(self, s_tripleset_raw, template, text, tag2ent):
+        # check template
+        template = self.fix_template_words(template)
+
         # tokenization
-        text = nlp.word_tokenize(text)
-        template = nlp.word_tokenize(template)
+        text = self.nlp.word_tokenize(text)
+        template = self.nlp.word_tokenize(template)
 
         # clean s_tripleset
         s_tripleset = [s for s in s_tripleset_raw if s]
-        self.cnt_dirty_data += len(s_tripleset_raw) - len(s_tripleset)
+        self.dirty[EMPTY_SENTENCE] += len(s_tripleset_raw) - len(s_tripleset)
 
-        if (not tag2ent) or (not s_tripleset):
-            self.cnt_dirty_data += not tag2ent
+        if not tag2ent:
+            self.dirty[MISSING_REFERENCES] += 1
+            return None
+        if not s_tripleset:
+            self.dirty[EMPTY_TRIPLESET] += 1
             return None
 
         # fix this case "same entity has different ners BRIDGE-1 PATIENT-1"
@@ -184,13 +455,8 @@ class RDFFileReader:
         for ent, tags in ent2tags.items():
             for tag in tags:
                 tag2uniq_tag[tag] = tags[0]
-        uniq_tag2ent = {
-            tag: ent
-            for tag, ent in tag2ent.items()
-            if tag in list(tag2uniq_tag.values())
-        }
-        for tag, uniq_tag in tag2uniq_tag.items():
-            template = template.replace(tag, uniq_tag)
+        uniq_tags = set(tag2uniq_tag.values())
+        uniq_tag2ent = {tag: ent for tag, ent in tag2ent.items() if tag in uniq_tags}
 
         assert uniq_tag2ent
         ent2uniq_tag = {v: k for k, v in uniq_tag2ent.items()}
@@ -198,39 +464,34 @@ class RDFFileReader:
 
         # clean out extra quotes around entity names
         uniq_tag2ent = {k: v.strip('"') for k, v in uniq_tag2ent.items()}
-        try:
-            s_tripleset = [
-                [
-                    (subj.strip('"'), predi, obj.strip('"'))
-                    for subj, predi, obj in s_triples
-                ]
-                for s_triples in s_tripleset
-            ]
-        except:
-            import pdb
-
-            pdb.set_trace()
-
-        # replaces '-' with '_' only in entity types
-        tags = set(uniq_tag2ent.keys())
-        for tag in tags:
-            template = template.replace(tag, tag.replace("-", "_"))
-        template = template.replace("BRIDGE-", "BRIDGE_")
-        template = template.replace("AGENT-", "AGENT_")
-        template = template.replace("PATIENT-", "PATIENT_")
+        for s_triples in s_tripleset:
+            for triple in s_triples:
+                if len(triple) != 3:
+                    raise ValueError(
+                        f"Malformed triple in entry {self.entry_ix}: {triple}"
+                    )
+        s_tripleset = [
+            [(subj.strip('"'), predi, obj.strip('"')) for subj, predi, obj in s_triples]
+            for s_triples in s_tripleset
+        ]
+
+        # replaces every tag by its unique tag, and '-' with '_' only in
+        # entity types, in a single scan of the template
+        template = normalize_tags(template, tag2uniq_tag)
         uniq_tag2ent = {k.replace("-", "_"): v for k, v in uniq_tag2ent.items()}
 
         return s_tripleset, template, text, uniq_tag2ent
 
     def fix_sentence(self, s_tripleset, template, tag2ent):
         ent2tags = {v: k for k, v in tag2ent.items()}
+        template = CompiledTemplate(template, tag2ent)
 
         # s_tripleset must meet "head && tail are in template && tag2ent"
         bad_triples = set()
         for triple_ix, triple in enumerate(s_tripleset):
             for ent in [triple[0], triple[-1]]:
                 if ent in ent2tags:
-                    if ent2tags[ent] not in template:
+                    if not template.has_tag(ent2tags[ent]):
                         bad_triples.add(triple_ix)
                         continue
                 else:
@@ -249,87 +510,546 @@ class RDFFileReader:
         tag2tri_ent = {k: v for k, v in tag2ent.items() if v in triple_entities}
 
         # templates only have triple_entities
-        for tag, ent in tag2ent.items():
-            if ent not in triple_entities:
-                ent = ent.replace("_", " ")
-                template = template.replace(tag, ent)
-
-        if {
-            word
-            for word in template.split()
-            if "AGENT" in word or "BRIDGE" in word or "PATIENT" in word
-        } != set(tag2tri_ent.keys()):
-            self.cnt_corefs += 1
+        template = template.fill(
+            {
+                tag: ent.replace("_", " ")
+                for tag, ent in tag2ent.items()
+                if ent not in triple_entities
+            }
+        )
+
+        if not template.is_delexicalized(tag2tri_ent.keys()):
+            self.dirty[NOT_DELEXICALIZED] += 1
         assert set(tag2tri_ent.values()) == triple_entities
 
         return s_tripleset, template, tag2tri_ent
 
 
-def process_data(data_set_type: str, parallel=True):
-    files = recurse_files(path.join("./data/webnlg", "raw", data_set_type))
-    xml_objs = [parse_xml_file(f) for f in files]
+def normalize_tags(template: str, tag2uniq_tag: Dict[str, str]) -> str:
+    """
+    Replaces every tag in `template` by its unique tag, written with `_`
+    instead of `-` (`BRIDGE-2` -> `AGENT_1`), and fixes any other
+    `BRIDGE-`/`AGENT-`/`PATIENT-` prefix to use `_`.
+    """
+
+    def replace(match):
+        tag = match.group()
+        if tag in tag2uniq_tag:
+            return tag2uniq_tag[tag].replace("-", "_")
+        return tag.replace("-", "_")
+
+    pattern = tag_pattern(tuple(sorted(tag2uniq_tag)), other="-")
+    return pattern.sub(replace, template)
+
+
+def process_data(
+    data_set_type: str,
+    parallel=True,
+    executor="ray",
+    nlp_options: dict = None,
+    reader_options: dict = None,
+    raw: str = RAW_DIR,
+    quarantine: Quarantine = None,
+    report: DirtyDataReport = None,
+    sample: Sample = None,
+    filters: Filters = None,
+    raw_version: str = None,
+):
+    """
+    Reads a split of the raw corpus into sentence-level records.
+
+    `nlp_options` configure the tokenizer (see `get_tokenizer`) and
+    `reader_options` are passed on to every `RDFFileReader`. `raw` is the
+    raw corpus directory or an archive of it, and `raw_version` the corpus
+    to read from a checkout or archive of the repository (see `read_raw`).
+    Entries that fail to read stop the run, unless a `quarantine` is given.
+    What is dropped as dirty data is counted into `report`, if given. With a
+    `sample`, only its entries of every raw file are read, and only the
+    entries matching `filters`, if given.
+    """
+    entries = (
+        row
+        for _, row in process_splits(
+            [data_set_type],
+            parallel,
+            executor,
+            nlp_options,
+            reader_options,
+            raw,
+            quarantine=quarantine,
+            report=report,
+            sample=sample,
+            filters=filters,
+            raw_version=raw_version,
+        )
+    )
+    return tqdm(entries, desc="WebNLG", unit="entry")
+
+
+def process_splits(
+    data_set_types: Sequence[str],
+    parallel=True,
+    executor="ray",
+    nlp_options: dict = None,
+    reader_options: dict = None,
+    raw: str = RAW_DIR,
+    quarantine: Quarantine = None,
+    report: DirtyDataReport = None,
+    sample: Sample = None,
+    filters: Filters = None,
+    raw_version: str = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Reads several splits of the raw corpus, yielding `(split, record)` with
+    the records of every split in serial order (see `process_data`).
+
+    In parallel, the files of all splits are fed to one worker pool, so the
+    workers move on to the next split instead of idling through the tail of
+    the current one.
+    """
+    for (split, _, _), rows in process_files(
+        data_set_types,
+        parallel,
+        executor,
+        nlp_options,
+        reader_options,
+        raw,
+        quarantine=quarantine,
+        report=report,
+        sample=sample,
+        filters=filters,
+        raw_version=raw_version,
+    ):
+        for row in rows:
+            yield split, row
+
+
+def process_files(
+    data_set_types: Sequence[str],
+    parallel=True,
+    executor="ray",
+    nlp_options: dict = None,
+    reader_options: dict = None,
+    raw: str = RAW_DIR,
+    skip: Dict[str, Set[str]] = None,
+    quarantine: Quarantine = None,
+    report: DirtyDataReport = None,
+    sample: Sample = None,
+    filters: Filters = None,
+    raw_version: str = None,
+) -> Iterator[Tuple[Tuple[str, int, str], List[Dict[str, Any]]]]:
+    """
+    `process_splits`, yielding `((split, file index, file name), records)`
+    for every chunk of every file, in order. The files of a split named in
+    `skip[split]` are not even parsed, nor are the entries out of `sample`
+    or the files out of `filters`. Files are parsed one at a time, as the
+    workers need more chunks, so only a bounded number of them is held in
+    memory, whatever the size of the corpus.
+
+    With a `quarantine`, entries that fail to read are handed to it along
+    with their file, instead of stopping the run. What the readers drop is
+    counted into `report`, if given.
+    """
+    reader_options = dict(reader_options or {}, quarantine=quarantine is not None)
+    skip = skip or {}
+
+    def parsed_files() -> Iterator[Tuple[Tuple[str, int, str], dict]]:
+        # One file at a time, the files of every split one after the other
+        for split in data_set_types:
+            for file_ix, (file_name, source) in enumerate(
+                raw_sources(split, raw, raw_version)
+            ):
+                if file_name in skip.get(split, ()):
+                    continue
+                if filters and not filters.keep_file(file_name):
+                    continue
+                structure = parse_raw_file(split, file_name, source, sample, filters)
+                yield (split, file_ix, file_name), structure
+
+    def collect(key, rows, quarantined, dirty):
+        record_dropped(key[0], key[2], quarantined, dirty, quarantine, report)
+        return key, rows
+
+    # The entity matcher is built once for the whole corpus, and shipped to
+    # every worker along with the tokenizer options. This takes a first pass
+    # over the raw files, which are parsed again as they are read
+    entities = (
+        alignment_entities(x for _, x in parsed_files())
+        if reader_options.get("align_entities")
+        else []
+    )
 
-    entries = []
     if not parallel:
         print(f"[Info] Processing data...")
 
-        chunks = [RDFFileReader(x).data for x in xml_objs]
-        entries = flatten_list(chunks)
+        nlp = get_nlp(**(nlp_options or {}))
+        get_aligner(entities)
+        for key, x in parsed_files():
+            reader = RDFFileReader(x, nlp=nlp, **reader_options)
+            yield collect(key, *read_results(reader))
+        report_unknown_units()
+        return
 
-    else:
-        num_shards: int = num_cpus if parallel else 1
-        print(f"[Info] Processing data in {num_shards} shards...")
-
-        iterator = (
-            pariter.from_items(xml_objs[0:5], num_shards=num_shards)
-            # .for_each(lambda f: cleaner.clean)
-            .for_each(lambda xmldata: RDFFileReader(xmldata).data)
-            .flatten()
+    num_shards: int = num_cpus
+    print(f"[Info] Processing data in {num_shards} shards ({executor})...")
+
+    chunks = (
+        (file_key + (entry_ix,), chunk)
+        for file_key, x in parsed_files()
+        for (_, entry_ix), chunk in split_entries([x])
+    )
+    for key, results in map_chunks(
+        chunks,
+        executor,
+        num_shards,
+        nlp_options or {},
+        reader_options,
+        task=read_results,
+        entities=entities,
+    ):
+        yield collect(key[:3], *results)
+    report_unknown_units()
+
+
+def split_entries(
+    xml_objs: Iterable[dict], chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[Tuple[int, int], dict]]:
+    """
+    Splits parsed files into work items of at most `chunk_size` entries,
+    each tagged with its (file index, entry index) so that results can be
+    put back into serial order.
+    """
+    for file_ix, structure in enumerate(xml_objs):
+        entries = RDFFileReader._triples_from_obj(
+            structure["benchmark"]["entries"], "entry"
         )
+        for entry_ix in range(0, len(entries), chunk_size):
+            chunk = entries[entry_ix : entry_ix + chunk_size]
+            yield (file_ix, entry_ix), {"benchmark": {"entries": {"entry": chunk}}}
 
-        entries = iterator.gather_async()
 
-    return tqdm(entries, desc="WebNLG", unit="entry")
+def corpus_entities(xml_objs: Iterable[dict]) -> Set[str]:
+    """Every entity referenced by the sentences of parsed files."""
+    entities = set()
+    for structure in xml_objs:
+        for entry in RDFFileReader._triples_from_obj(
+            structure["benchmark"]["entries"], "entry"
+        ):
+            lex = entry["lex"] if isinstance(entry["lex"], list) else [entry["lex"]]
+            for s in lex:
+                for r in RDFFileReader._triples_from_obj(s["references"], "reference"):
+                    entities.add(r["@entity"].strip('"'))
+    return entities
+
+
+def alignment_entities(xml_objs: Iterable[dict]) -> List[str]:
+    """
+    Every entity of parsed files, sorted, to build the entity aligners over
+    once, up front (see `map_chunks`), with their numbers phrased.
+    """
+    entities = sorted(corpus_entities(xml_objs))
+    if entities:
+        prime_number_phrasings(map(entity_base, entities))
+    return entities
+
+
+def records(reader: RDFFileReader) -> List[Dict[str, Any]]:
+    return reader.data
+
+
+def read_results(
+    reader: RDFFileReader,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]], Counter]:
+    """The records of a reader, with what it quarantined and dropped."""
+    return reader.data, reader.quarantined, reader.dirty
+
+
+def record_dropped(
+    split: str,
+    file_name: str,
+    quarantined: List[Dict[str, str]],
+    dirty: Counter,
+    quarantine: Quarantine = None,
+    report: DirtyDataReport = None,
+) -> None:
+    """
+    Hands what was read from a raw file (see `read_results`) to `quarantine`
+    and `report`, if given.
+    """
+    if quarantined:
+        quarantine.add(split, file_name, quarantined)
+    if report is not None:
+        report.add(split, file_name, dirty)
+
+
+def map_chunks(
+    chunks: Iterator[Tuple[Any, dict]],
+    executor: str,
+    num_shards: int,
+    nlp_options: dict,
+    reader_options: dict,
+    task: Callable[[RDFFileReader], Any] = records,
+    entities: Sequence[str] = (),
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    Reads every chunk with an `RDFFileReader` on a pool of `num_shards`
+    workers and yields `(key, task(reader))` in the order of `chunks`.
+
+    `task` runs in the worker, so it can reduce a chunk to something smaller
+    than its records. It must be picklable, i.e. a module-level function.
+    Every worker builds its entity aligner over `entities` once, up front.
+    """
+    return EXECUTORS[executor](
+        chunks, num_shards, nlp_options, reader_options, task, entities=entities
+    )
+
+
+def gather_ordered(
+    chunks: Iterator[Tuple[Any, dict]],
+    submit: Callable[[Any, dict], Any],
+    get: Callable[[Any], Tuple[Any, Any]],
+    max_pending: int,
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    Submits `chunks` to a worker pool and yields their `(key, result)` in
+    submission order.
+
+    Chunks that finish early stay parked in their pending handles until
+    every chunk before them has been yielded. At most `max_pending` chunks
+    are running or waiting at any time, so memory stays bounded no matter
+    how large the corpus is.
+    """
+    pending = deque()
+
+    for key, structure in chunks:
+        pending.append(submit(key, structure))
+        if len(pending) >= max_pending:
+            yield get(pending.popleft())
+
+    while pending:
+        yield get(pending.popleft())
+
+
+@ray.remote
+class RDFWorker:
+    """A ray actor that loads the tokenizer once and reads many chunks."""
+
+    def __init__(self, nlp_options: dict):
+        self.nlp = get_nlp(**nlp_options)
+        self.aligner = get_aligner()
+
+    def require(self, entities: Sequence[str]):
+        """Makes the aligner of this actor cover `entities`."""
+        self.aligner = get_aligner(entities)
+
+    def read(self, key, structure: dict, reader_options: dict, task: Callable):
+        return key, task(
+            RDFFileReader(
+                structure, nlp=self.nlp, aligner=self.aligner, **reader_options
+            )
+        )
+
+
+# The actors of this process by `(num_shards, nlp_options)`, so that every
+# call of `map_chunks` reuses the tokenizers they loaded
+_ray_workers = {}
+
+
+def get_ray_workers(num_shards: int, nlp_options: dict) -> list:
+    """
+    Returns this process' `num_shards` ray actors for `nlp_options`, creating
+    them on first use.
+    """
+    key = num_shards, tuple(sorted(nlp_options.items()))
+    if key not in _ray_workers:
+        _ray_workers[key] = [RDFWorker.remote(nlp_options) for _ in range(num_shards)]
+    return _ray_workers[key]
+
+
+def _gather_ray(
+    chunks,
+    num_shards: int,
+    nlp_options: dict,
+    reader_options: dict,
+    task: Callable,
+    entities: Sequence[str] = (),
+) -> Iterator[Tuple[Any, Any]]:
+    if not ray.is_initialized():
+        ray.init(num_cpus=num_shards, include_dashboard=False)
+
+    pool = get_ray_workers(num_shards, nlp_options)
+    if entities:
+        entities_ref = ray.put(list(entities))
+        ray.get([worker.require.remote(entities_ref) for worker in pool])
+    workers = cycle(pool)
+
+    yield from gather_ordered(
+        chunks,
+        submit=lambda key, structure: next(workers).read.remote(
+            key, structure, reader_options, task
+        ),
+        get=ray.get,
+        max_pending=num_shards * PENDING_PER_SHARD,
+    )
+
+
+def _init_pool_worker(nlp_options: dict, entities: Sequence[str] = ()):
+    get_nlp(**nlp_options)
+    get_aligner(entities)
+
+
+def _read_chunk(key, structure: dict, reader_options: dict, task: Callable):
+    return key, task(RDFFileReader(structure, **reader_options))
+
+
+def _gather_pool(
+    chunks,
+    num_shards: int,
+    nlp_options: dict,
+    reader_options: dict,
+    task: Callable,
+    method: str,
+    entities: Sequence[str] = (),
+) -> Iterator[Tuple[Any, Any]]:
+    if method == "fork":
+        # Load the model and build the matcher before forking and keep the
+        # collector away from them, so every worker shares the parent's
+        # pages copy-on-write
+        get_nlp(**nlp_options)
+        get_aligner(entities)
+        gc.freeze()
+        initargs = (nlp_options,)
+    else:
+        initargs = (nlp_options, entities)
+
+    context = multiprocessing.get_context(method)
+    try:
+        with context.Pool(
+            num_shards, initializer=_init_pool_worker, initargs=initargs
+        ) as pool:
+            yield from gather_ordered(
+                chunks,
+                submit=lambda key, structure: pool.apply_async(
+                    _read_chunk, (key, structure, reader_options, task)
+                ),
+                get=lambda result: result.get(),
+                max_pending=num_shards * PENDING_PER_SHARD,
+            )
+    finally:
+        if method == "fork":
+            gc.unfreeze()
+
+
+EXECUTORS: Dict[str, Callable[..., Iterator[Tuple[Any, Any]]]] = {
+    "ray": _gather_ray,
+    "fork": lambda *args, **kwargs: _gather_pool(*args, method="fork", **kwargs),
+    "spawn": lambda *args, **kwargs: _gather_pool(*args, method="spawn", **kwargs),
+}
+
 
 def recurse_files(folder: str) -> List[str]:
+    """
+    The files under `folder`, sorted, so that they come in the same order
+    from run to run (see `checkpoint.Checkpoint`).
+    """
     if path.isdir(folder):
         return flatten_list(
             [
                 recurse_files(folder + "/" + f)
-                for f in os.listdir(folder)
+                for f in sorted(os.listdir(folder))
                 if not f.startswith(".")
             ]
         )
     return [folder]
 
 
-def save_data(data, data_set_type):
+def save_path(data_set_type: str, out_dir: str = OUT_DIR) -> str:
+    """
+    The processed jsonl file of a split in `out_dir`, or `data_set_type` if
+    it is a path.
+    """
+    if data_set_type.endswith(".jsonl"):
+        return data_set_type
     data_set_type = "valid" if data_set_type == "dev" else data_set_type
-    save_f = path.join("./data/webnlg", data_set_type + ".jsonl")
+    return path.join(out_dir, data_set_type + ".jsonl")
+
+
+def save_data(
+    data,
+    data_set_type,
+    observers: Iterable[Callable[[dict], Any]] = (),
+    out_dir: str = OUT_DIR,
+):
+    """
+    Writes records to `{out_dir}/{split}.jsonl`, calling every observer
+    with each record as it is written, e.g. to build an index on the fly.
+    """
+    save_splits(
+        ((data_set_type, row) for row in data),
+        [data_set_type],
+        {data_set_type: observers},
+        out_dir,
+    )
 
-    total = 0
-    with jsonl.open(save_f, "w") as f:
-        for row in data:
-            total += 1
-            f.write(row)
 
-    print(f"[Info] Saved {total} entries into {save_f}")
+def save_splits(
+    data: Iterable[Tuple[str, dict]],
+    data_set_types: Sequence[str],
+    observers: Dict[str, Iterable[Callable[[dict], Any]]] = None,
+    out_dir: str = OUT_DIR,
+):
+    """
+    Writes `(split, record)` pairs, e.g. from `process_splits`, to one file
+    per split (see `save_data`), calling the split's observers with every
+    record.
+    """
+    observers = observers or {}
+    save_fs = {split: save_path(split, out_dir) for split in data_set_types}
+    totals = dict.fromkeys(data_set_types, 0)
+
+    with ExitStack() as stack:
+        writers = {
+            split: stack.enter_context(jsonl.open(save_f, "w"))
+            for split, save_f in save_fs.items()
+        }
+        for split, row in data:
+            totals[split] += 1
+            writers[split].write(row)
+            for observer in observers.get(split, ()):
+                observer(row)
+
+    for split, save_f in save_fs.items():
+        print(f"[Info] Saved {totals[split]} entries into {save_f}")
 
 
 def download(
-    repo: str = "ThiagoCF05/webnlg", revision: str = "711a8ca", version: str = "v1.6"
+    repo: str = "ThiagoCF05/webnlg",
+    revision: str = "711a8ca",
+    version: str = "v1.6",
+    source: str = None,
+    raw: str = RAW_DIR,
+    cache_dir: str = CACHE_DIR,
 ) -> None:
-    cmd = [
-        f"rm -rf data/webnlg 2>/dev/null \n",
-        f"mkdir -p data/webnlg \n",
-        f"git clone --depth 1 https://github.com/{repo}.git data_webnlg\n",
-        f"cd data_webnlg; git checkout {revision}; cd .. \n",
-        f"cp -a data_webnlg/data/{version}/en/ data/webnlg/raw\n",
-        f"rm -rf data_webnlg\n",
-    ]
-
-    print("[Info] Downloading enriched WebNLG data...")
-
-    for x in cmd:
-        print(f"> {x}")
-        shell(x)
+    """
+    Puts the English corpus of `repo` at `revision` into `raw`, through the
+    local cache (see `cache.RawCache`).
+
+    The corpus is only fetched when it is not cached yet or its cached files
+    are corrupt: from `source` (a local mirror, i.e. a checkout or archive of
+    the repository, or of its `en/` directory) if given, otherwise by cloning
+    the repository. Only the files of `raw` that differ from the cached ones
+    are replaced, and nothing else under `data/webnlg` is touched.
+    """
+    cache = RawCache(cache_dir)
+    manifest = cache.manifest(repo, revision, version)
+    if not manifest or cache.missing_objects(manifest):
+        print(f"[Info] Caching enriched WebNLG data from {source or repo}...")
+        files = (
+            source_files(source, version)
+            if source
+            else clone_files(repo, revision, version)
+        )
+        manifest = cache.ingest(files, repo, revision, version)
+
+    kept, copied = cache.materialize(manifest, raw)
+    print(f"[Info] Raw data in {raw}: {kept} files unchanged, {copied} copied")
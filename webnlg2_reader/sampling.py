@@ -0,0 +1,72 @@
+"""
+Reproducible samples of the raw corpus, for quick development runs. Every
+raw file holds the entries of one category with one triple count (e.g.
+`3triples/Airport.xml`), so the same number of entries is picked from each
+file, and every category and triple count is covered.
+
+Only the picked entries are parsed: they are cut out of the raw text, and
+the rest of the file is never handed to the XML parser.
+"""
+
+from typing import Callable, Union
+
+import random
+import re
+
+import xmltodict
+
+__all__ = ["Sample", "stratum"]
+
+ENTRY_PATTERN = re.compile(rb"<entry[\s>].*?</entry>", re.DOTALL)
+
+
+def stratum(file_name: str) -> str:
+    """The triple count directory and category file of a raw file name."""
+    return "/".join(file_name.replace("\\", "/").split("/")[-2:])
+
+
+class Sample:
+    """
+    `size` entries of every raw file, picked at random with `seed`. Picks
+    only depend on the seed, split and stratum, so a directory and an
+    archive of the same corpus give the same sample.
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        if size < 1:
+            raise ValueError(f"A sample needs at least 1 entry per file, not {size}")
+        self.size = size
+        self.seed = seed
+
+    def to_json(self) -> dict:
+        return {"size": self.size, "seed": self.seed}
+
+    def parse(
+        self,
+        split: str,
+        file_name: str,
+        source: Union[str, bytes],
+        keep: Callable[[dict], bool] = None,
+    ) -> dict:
+        """
+        Parses the sampled entries of a file from `raw_sources`, in file
+        order. With `keep`, entries are drawn until `size` of them pass it,
+        parsing them one by one.
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                source = f.read()
+        spans = [match.group() for match in ENTRY_PATTERN.finditer(source)]
+
+        order = list(range(len(spans)))
+        random.Random(f"{self.seed}/{split}/{stratum(file_name)}").shuffle(order)
+        picked = []
+        for ix in order:
+            if len(picked) == self.size:
+                break
+            if keep is None or keep(xmltodict.parse(spans[ix])["entry"]):
+                picked.append(ix)
+        entries = b"".join(spans[ix] for ix in sorted(picked))
+        return xmltodict.parse(
+            b"<benchmark><entries>" + entries + b"</entries></benchmark>"
+        )
@@ -0,0 +1,67 @@
+from typing import List
+
+import re
+import unicodedata
+
+from .patterns.abbreviations import abbreviations, sentence_final_abbreviations
+from .patterns.constants import SENTENCE_PUNCT
+
+__all__ = ["RegexSentenceSplitter"]
+
+
+class RegexSentenceSplitter:
+    """
+    A pure-regex replacement for spaCy's rule-based sentencizer.
+
+    It expects text that already went through `Tokenizer.word_tokenize`, and ends
+    a sentence at the same tokens the sentencizer does: a sentence
+    punctuation token, followed by any further punctuation tokens. On top of
+    that it knows the abbreviations that `fix_tokenize` used to patch by
+    hand, so it does not split after "Sc ." and does split after "B.S."
+    when a capitalized word follows.
+    """
+
+    TOKEN = re.compile(r"\S+")
+
+    def __init__(
+        self,
+        abbreviations=abbreviations,
+        sentence_final_abbreviations=sentence_final_abbreviations,
+    ):
+        self.abbreviations = set(abbreviations)
+        self.sentence_final_abbreviations = set(sentence_final_abbreviations)
+
+    def __call__(self, text: str) -> List[str]:
+        return self.sent_tokenize(text)
+
+    def sent_tokenize(self, text: str) -> List[str]:
+        tokens = [(m.start(), m.group()) for m in self.TOKEN.finditer(text)]
+        if not tokens:
+            return []
+
+        starts = [tokens[0][0]]
+        seen_end = False
+        for ix, (start, token) in enumerate(tokens):
+            if seen_end and not self.is_punct(token):
+                starts.append(start)
+                seen_end = False
+            if self.ends_sentence(tokens, ix):
+                seen_end = True
+
+        ends = starts[1:] + [len(text)]
+        return [text[start:end].strip() for start, end in zip(starts, ends)]
+
+    def ends_sentence(self, tokens, ix: int) -> bool:
+        token = tokens[ix][1]
+
+        if token in SENTENCE_PUNCT:
+            return not (ix and tokens[ix - 1][1] + token in self.abbreviations)
+
+        if token in self.sentence_final_abbreviations and ix + 1 < len(tokens):
+            return tokens[ix + 1][1][:1].isupper()
+
+        return False
+
+    @staticmethod
+    def is_punct(token: str) -> bool:
+        return all(unicodedata.category(c).startswith("P") for c in token)
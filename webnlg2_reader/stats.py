@@ -0,0 +1,148 @@
+"""
+Dataset statistics, as listed in the README, computed in one streaming pass
+over processed splits or the raw corpus.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from collections import Counter
+from itertools import islice
+import json
+import multiprocessing
+
+from .reader import (
+    PENDING_PER_SHARD,
+    RAW_DIR,
+    RDFFileReader,
+    gather_ordered,
+    get_nlp,
+    map_chunks,
+    read_raw,
+    split_entries,
+)
+
+# Lines of a processed split handed to a worker at a time
+CHUNK_LINES = 2048
+
+
+class DatasetStats:
+    """
+    Counts over a set of records. Partial counts from different workers are
+    combined with `+=`, so any split of the data gives the same result.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.entities = Counter()
+        self.ner = Counter()
+        self.relations = Counter()
+        self.txt = Counter()
+        self.tgt = Counter()
+        self.tgt_len_total = 0
+        self.tgt_len_max = 0
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.size += 1
+        for subj, predi, obj in row["triples"]:
+            self.entities.update((subj, obj))
+            self.relations[predi] += 1
+        self.ner.update(tag.lower() for tag in row["ner2ent"])
+        self.txt.update(row["target_txt"].lower().split())
+
+        tgt = row["target"].lower().split()
+        self.tgt.update(tgt)
+        self.tgt_len_total += len(tgt)
+        self.tgt_len_max = max(self.tgt_len_max, len(tgt))
+
+    def __iadd__(self, other: "DatasetStats") -> "DatasetStats":
+        self.size += other.size
+        self.entities += other.entities
+        self.ner += other.ner
+        self.relations += other.relations
+        self.txt += other.txt
+        self.tgt += other.tgt
+        self.tgt_len_total += other.tgt_len_total
+        self.tgt_len_max = max(self.tgt_len_max, other.tgt_len_max)
+        return self
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "DatasetStats":
+        stats = cls()
+        for row in rows:
+            stats.add(row)
+        return stats
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "vocab_entities": len(self.entities),
+            "vocab_ner": len(self.ner),
+            "ner": sorted(self.ner),
+            "vocab_relations": len(self.relations),
+            "vocab_txt": len(self.txt),
+            "vocab_tgt": len(self.tgt),
+            "len_tgt_avg": round(self.tgt_len_total / self.size, 1) if self.size else 0,
+            "len_tgt_max": self.tgt_len_max,
+        }
+
+
+def _stats_of_lines(key: int, lines: List[str]) -> Tuple[int, DatasetStats]:
+    return key, DatasetStats.from_rows(json.loads(line) for line in lines)
+
+
+def _stats_of_reader(reader: RDFFileReader) -> DatasetStats:
+    return DatasetStats.from_rows(reader.data)
+
+
+def processed_stats(file_name: str, num_workers: int = 1) -> DatasetStats:
+    """Counts a processed `*.jsonl` split, `CHUNK_LINES` lines per task."""
+    stats = DatasetStats()
+    with open(file_name, encoding="utf-8") as f:
+        chunks: Iterator[Tuple[int, List[str]]] = enumerate(
+            iter(lambda: list(islice(f, CHUNK_LINES)), [])
+        )
+        if num_workers <= 1:
+            for key, lines in chunks:
+                stats += _stats_of_lines(key, lines)[1]
+            return stats
+
+        with multiprocessing.Pool(num_workers) as pool:
+            for _, partial in gather_ordered(
+                chunks,
+                submit=lambda key, lines: pool.apply_async(
+                    _stats_of_lines, (key, lines)
+                ),
+                get=lambda result: result.get(),
+                max_pending=num_workers * PENDING_PER_SHARD,
+            ):
+                stats += partial
+    return stats
+
+
+def raw_stats(
+    data_set_type: str,
+    num_workers: int = 1,
+    executor: str = "fork",
+    nlp_options: dict = None,
+    raw: str = RAW_DIR,
+    raw_version: str = None,
+) -> DatasetStats:
+    """
+    Counts a split of the raw corpus (a directory or an archive, see
+    `read_raw`) as `RDFFileReader` decomposes it. Each worker reduces its
+    chunks to partial counts, so records never leave the worker.
+    """
+    chunks = split_entries(read_raw(data_set_type, raw, raw_version))
+
+    stats = DatasetStats()
+    if num_workers <= 1:
+        nlp = get_nlp(**(nlp_options or {}))
+        for _, structure in chunks:
+            stats += _stats_of_reader(RDFFileReader(structure, nlp=nlp))
+        return stats
+
+    for _, partial in map_chunks(
+        chunks, executor, num_workers, nlp_options or {}, {}, task=_stats_of_reader
+    ):
+        stats += partial
+    return stats
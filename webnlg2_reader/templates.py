@@ -0,0 +1,153 @@
+from typing import Dict, Iterable, List, Pattern, Sequence, Tuple
+
+from functools import lru_cache
+import re
+
+__all__ = [
+    "ROLES",
+    "CompiledTemplate",
+    "tag_pattern",
+    "surface_form",
+    "relexicalize",
+    "relexicalize_batch",
+]
+
+ROLES = ("AGENT", "BRIDGE", "PATIENT")
+
+
+@lru_cache(maxsize=None)
+def tag_pattern(tags: Tuple[str, ...] = (), other: str = r"_\d+") -> Pattern:
+    """
+    A pattern matching `tags` and any `AGENT_n`/`BRIDGE_n`/`PATIENT_n` tag,
+    longest first, with one capturing group around the whole tag. Other
+    tags are a role followed by `other`, e.g. `"-"` for any `AGENT-` prefix
+    of the raw corpus.
+    """
+    alternatives = [re.escape(t) for t in sorted(tags, key=len, reverse=True)]
+    roles = "(?:" + "|".join(ROLES) + ")" + other
+    return re.compile("(" + "|".join(alternatives + [roles]) + ")")
+
+
+class CompiledTemplate:
+    """
+    A template split once into literal text and tag slots.
+
+    `tokens` alternates literal text (even indices) and tags (odd indices),
+    so that `"".join(tokens)` is the template. `slots` holds the indices of
+    the tags in `tokens`, `tags` the distinct tags in order of appearance and
+    `tag_ids` the index into `tags` of every slot. Checking for a tag or
+    filling tags in is then a matter of looking at the slots, instead of
+    searching the template string again.
+    """
+
+    __slots__ = ("tokens", "slots", "tags", "tag_ids", "_standalone", "_stray")
+
+    def __init__(self, template: str, tags: Iterable[str] = ()):
+        self._build(tag_pattern(tuple(sorted(tags))).split(template))
+
+    def _build(self, tokens: List[str]) -> None:
+        self.tokens = tokens
+        self.slots = list(range(1, len(tokens), 2))
+
+        tag_index: Dict[str, int] = {}
+        self.tag_ids = [
+            tag_index.setdefault(tokens[i], len(tag_index)) for i in self.slots
+        ]
+        self.tags = list(tag_index)
+
+        # Tags that are whole whitespace-separated words, and whether any word
+        # mentions a role without being exactly a tag
+        self._standalone = set()
+        self._stray = any(
+            role in tokens[i] for i in range(0, len(tokens), 2) for role in ROLES
+        )
+        for i in self.slots:
+            before, after = tokens[i - 1], tokens[i + 1]
+            left = before[-1:].isspace() or (i == 1 and not before)
+            right = after[:1].isspace() or (i == len(tokens) - 2 and not after)
+            if left and right:
+                self._standalone.add(tokens[i])
+            else:
+                self._stray = True
+
+    def __str__(self) -> str:
+        return "".join(self.tokens)
+
+    def __bool__(self) -> bool:
+        return any(self.tokens)
+
+    def has_tag(self, tag: str) -> bool:
+        return tag in self.tags
+
+    def is_delexicalized(self, tags: Iterable[str]) -> bool:
+        """
+        Whether the words of the template that mention a role are exactly
+        `tags`.
+        """
+        return not self._stray and self._standalone == set(tags)
+
+    def fill(self, tag2text: Dict[str, str]) -> "CompiledTemplate":
+        """Returns a copy with the slots of `tag2text`'s tags replaced by text."""
+        tokens = [self.tokens[0]]
+        for i in self.slots:
+            tag = self.tokens[i]
+            if tag in tag2text:
+                tokens[-1] += tag2text[tag] + self.tokens[i + 1]
+            else:
+                tokens += [tag, self.tokens[i + 1]]
+
+        filled = CompiledTemplate.__new__(CompiledTemplate)
+        filled._build(tokens)
+        return filled
+
+    def to_json(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "slots": self.slots,
+            "tags": self.tags,
+            "tag_ids": self.tag_ids,
+        }
+
+    @classmethod
+    def from_json(cls, obj: dict) -> "CompiledTemplate":
+        compiled = cls.__new__(cls)
+        compiled._build(obj["tokens"])
+        return compiled
+
+
+@lru_cache(maxsize=None)
+def surface_form(entity: str) -> str:
+    """How `fix_sentence` writes an entity back into text."""
+    return entity.replace("_", " ")
+
+
+def relexicalize(template: str, ner2ent: Dict[str, str]) -> str:
+    return relexicalize_batch([template], [ner2ent])[0]
+
+
+def relexicalize_batch(
+    templates: Sequence[str], ner2ent_list: Sequence[Dict[str, str]]
+) -> List[str]:
+    """
+    Fills every tag of `templates[i]` that is a key of `ner2ent_list[i]`
+    with its entity, written the way `fix_sentence` writes non-triple
+    entities (`ent.replace("_", " ")`). Other tags are left as they are.
+
+    All templates are scanned once with the same precompiled tag pattern,
+    and the surface form of every entity is only built once.
+    """
+    if len(templates) != len(ner2ent_list):
+        raise ValueError(
+            f"Got {len(templates)} templates but {len(ner2ent_list)} ner2ent maps"
+        )
+
+    sub = tag_pattern().sub
+    filled = []
+    for template, ner2ent in zip(templates, ner2ent_list):
+
+        def replace(match):
+            tag = match.group()
+            return surface_form(ner2ent[tag]) if tag in ner2ent else tag
+
+        filled.append(sub(replace, template))
+    return filled
@@ -0,0 +1,232 @@
+from typing import Dict, List, Type
+
+from abc import ABC, abstractmethod
+import os
+import re
+
+from .sentences import RegexSentenceSplitter
+
+__all__ = [
+    "Tokenizer",
+    "SpacyTokenizer",
+    "Spacy2Tokenizer",
+    "Spacy3Tokenizer",
+    "RegexTokenizer",
+    "BACKENDS",
+    "DEFAULT_BACKEND",
+    "get_tokenizer",
+]
+
+
+class Tokenizer(ABC):
+    """Word and sentence tokenization as used by `RDFFileReader`."""
+
+    @abstractmethod
+    def sent_tokenize(self, text: str) -> List[str]:
+        pass
+
+    @abstractmethod
+    def tokenize(self, text: str) -> List[str]:
+        pass
+
+    def word_tokenize(self, text, lower=False):  # create a tokenizer function
+        if text is None:
+            return text
+        text = " ".join(text.split())
+        if lower:
+            text = text.lower()
+        return " ".join(self.tokenize(text))
+
+
+class SpacyTokenizer(Tokenizer):
+    """
+    spaCy tokenizer and rule-based sentencizer.
+
+    By default the full `en_core_web_md` package is loaded, with everything
+    but the tokenizer disabled. With `lightweight=True` only
+    `spacy.blank("en")` is built, which skips the model weights and word
+    vectors entirely. `tokenizer_path` additionally loads tokenizer rules
+    saved with `save_tokenizer`, so that the tokens are byte-identical to
+    those of the model the rules were exported from. With
+    `sentencizer="regex"`, sentences are split by `RegexSentenceSplitter`
+    instead of spaCy.
+    """
+
+    MODEL = "en_core_web_md"
+
+    def __init__(
+        self,
+        lightweight: bool = False,
+        tokenizer_path: str = None,
+        sentencizer: str = "spacy",
+    ):
+        import spacy
+
+        if lightweight or tokenizer_path:
+            self.nlp = spacy.blank("en")
+            if tokenizer_path:
+                with open(tokenizer_path, "rb") as f:
+                    self.nlp.tokenizer.from_bytes(f.read())
+        else:
+            # Ensure spacy model is installed
+            try:
+                __import__(self.MODEL)
+            except ImportError:
+                spacy.cli.download(self.MODEL)
+
+            self.nlp = self.load_model(spacy)
+
+        self.splitter = None
+        if sentencizer == "regex":
+            self.splitter = RegexSentenceSplitter()
+        else:
+            self.add_sentencizer()
+
+    @abstractmethod
+    def load_model(self, spacy):
+        pass
+
+    @abstractmethod
+    def add_sentencizer(self) -> None:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def sentence_text(sent) -> str:
+        pass
+
+    def sent_tokenize(self, text):
+        if self.splitter:
+            return self.splitter(text)
+
+        doc = self.nlp(text)
+        sentences = [self.sentence_text(sent).strip() for sent in doc.sents]
+        return sentences
+
+    def tokenize(self, text):
+        return [tok.text for tok in self.nlp.tokenizer(text)]
+
+    def save_tokenizer(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.nlp.tokenizer.to_bytes())
+
+
+class Spacy2Tokenizer(SpacyTokenizer):
+    def load_model(self, spacy):
+        return spacy.load(self.MODEL, disable=["ner", "parser", "tagger"])
+
+    def add_sentencizer(self):
+        self.nlp.add_pipe(self.nlp.create_pipe("sentencizer"))
+
+    @staticmethod
+    def sentence_text(sent):
+        return sent.string
+
+
+class Spacy3Tokenizer(SpacyTokenizer):
+    def load_model(self, spacy):
+        return spacy.load(
+            self.MODEL,
+            exclude=[
+                "tok2vec",
+                "tagger",
+                "parser",
+                "attribute_ruler",
+                "lemmatizer",
+                "ner",
+            ],
+        )
+
+    def add_sentencizer(self):
+        self.nlp.add_pipe("sentencizer")
+
+    @staticmethod
+    def sentence_text(sent):
+        return sent.text
+
+
+class RegexTokenizer(Tokenizer):
+    """
+    A dependency-free approximation of spaCy's English tokenizer: prefixes,
+    suffixes and infixes are split off each whitespace-separated chunk by
+    regular expressions, and sentences are split by `RegexSentenceSplitter`.
+
+    spaCy options are accepted and ignored, so that backends can be swapped
+    without changing the rest of the configuration.
+    """
+
+    EXCEPTIONS = {
+        "Adm.", "Ala.", "Apr.", "Ariz.", "Ark.", "Aug.", "Bros.", "Calif.",
+        "Co.", "Colo.", "Conn.", "Corp.", "D.C.", "Dec.", "Del.", "Dr.",
+        "Feb.", "Fla.", "Ga.", "Gen.", "Gov.", "Ill.", "Inc.", "Ind.", "Jan.",
+        "Jr.", "Jul.", "Jun.", "Kan.", "Ky.", "La.", "Ltd.", "Mar.", "Mass.",
+        "Md.", "Mich.", "Minn.", "Miss.", "Mo.", "Mont.", "Mr.", "Mrs.", "Ms.",
+        "Mt.", "N.C.", "N.Y.", "Nev.", "Nov.", "Oct.", "Okla.", "Ore.", "Pa.",
+        "Ph.D.", "Prof.", "Rep.", "Rev.", "Sen.", "Sep.", "Sept.", "St.",
+        "Tenn.", "Va.", "Wash.", "Wis.", "a.m.", "e.g.", "i.e.", "p.m.",
+        "vs.",
+    }  # fmt: skip
+
+    PREFIX = re.compile(r"""^[(\[{"'`“‘«$£€¿¡]""")
+    SUFFIX = re.compile(
+        r"""(?:['’][sS]|(?i:n['’]t)|\.{2,}|…|(?<=[0-9a-z%"'”’)\]])\."""
+        r"""|(?<=[A-Z][A-Z])\.|[,;:!?)\]}"'”’»%—–])$"""
+    )
+    INFIX = re.compile(
+        r"(\.{2,}|(?<=[0-9])[+\-*^](?=[0-9-])|(?<=[a-z0-9])[:<>=/](?=[a-z])"
+        r"|(?<=[A-Za-z]),(?=[A-Za-z])|(?<=[A-Za-z0-9])(?:--|-|–|—|~)(?=[A-Za-z]))"
+    )
+
+    def __init__(self, **spacy_options):
+        self.splitter = RegexSentenceSplitter()
+
+    def sent_tokenize(self, text):
+        return self.splitter(text)
+
+    def tokenize(self, text):
+        return [tok for chunk in text.split() for tok in self._split(chunk)]
+
+    def _split(self, chunk: str) -> List[str]:
+        prefixes, suffixes = [], []
+        while chunk and chunk not in self.EXCEPTIONS:
+            if len(chunk) > 1 and self.PREFIX.match(chunk):
+                prefixes.append(chunk[0])
+                chunk = chunk[1:]
+                continue
+            match = self.SUFFIX.search(chunk)
+            if match and match.start() > 0:
+                suffixes.insert(0, match.group())
+                chunk = chunk[: match.start()]
+                continue
+            break
+
+        if chunk in self.EXCEPTIONS:
+            infixed = [chunk]
+        else:
+            infixed = [tok for tok in self.INFIX.split(chunk) if tok]
+        return prefixes + infixed + suffixes
+
+
+BACKENDS: Dict[str, Type[Tokenizer]] = {
+    "spacy2": Spacy2Tokenizer,
+    "spacy3": Spacy3Tokenizer,
+    "regex": RegexTokenizer,
+}
+
+# "spacy" picks the backend matching the installed spaCy version
+DEFAULT_BACKEND = os.environ.get("WEBNLG2_TOKENIZER", "spacy")
+
+
+def get_tokenizer(backend: str = None, **options) -> Tokenizer:
+    backend = backend or DEFAULT_BACKEND
+    if backend == "spacy":
+        import spacy
+
+        backend = "spacy2" if spacy.__version__.startswith("2.") else "spacy3"
+
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown tokenizer backend {backend!r}, "
+            f"choose from {['spacy'] + sorted(BACKENDS)}"
+        )
+    return BACKENDS[backend](**options)
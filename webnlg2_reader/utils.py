@@ -1,6 +1,20 @@
 # -*- coding: utf-8 -*-
-from typing import Any, List, Tuple, Dict, Callable, Union
-
+from typing import (
+    Any,
+    Iterable,
+    List,
+    Sequence,
+    Tuple,
+    Dict,
+    Callable,
+    Union,
+    Optional,
+    FrozenSet,
+)
+
+from collections import Counter, defaultdict
+from functools import lru_cache
+from hashlib import blake2b
 from itertools import chain, permutations
 import json
 import os
@@ -8,19 +22,13 @@ import re
 from subprocess import PIPE, Popen, STDOUT
 import sys
 
-import spacy
-
-# Ensure spacy model is installed
-try:
-    import en_core_web_md
-except ImportError:
-    spacy.cli.download(model="en_core_web_md")
-
+from .matching import AhoCorasick
 from .patterns.constants import SPLITABLES
 from .patterns.filter_dic_raw import filter_dic_raw
 from .patterns.fix_template_word import fix_template_word
 from .patterns.fix_tokenize import fix_tokenize
 from .patterns.misc import misspelling, rephrasing, rephrasing_must
+from .patterns.units import units
 
 
 class DataReader:
@@ -101,27 +109,6 @@ class Cleaner:
         return filter_dic_raw
 
 
-class NLP:
-    def __init__(self):
-
-        self.nlp = spacy.load("en_core_web_md", disable=["ner", "parser", "tagger"])
-        self.nlp.add_pipe(self.nlp.create_pipe("sentencizer"))
-
-    def sent_tokenize(self, text):
-        doc = self.nlp(text)
-        sentences = [sent.string.strip() for sent in doc.sents]
-        return sentences
-
-    def word_tokenize(self, text, lower=False):  # create a tokenizer function
-        if text is None:
-            return text
-        text = " ".join(text.split())
-        if lower:
-            text = text.lower()
-        toks = [tok.text for tok in self.nlp.tokenizer(text)]
-        return " ".join(toks)
-
-
 def show_var(expression, joiner="\n"):
     """
     Prints out the name and value of variables.
@@ -164,11 +151,7 @@ def fwrite(new_doc, path, mode="w", no_overwrite=False):
         print("[Info] Path does not exist in fwrite():", str(path))
         return
     if no_overwrite and os.path.isfile(path):
-        print("[Error] pls choose whether to continue, as file already exists:", path)
-        import pdb
-
-        pdb.set_trace()
-        return
+        raise FileExistsError(f"Not overwriting {path}")
     with open(path, mode) as f:
         f.write(new_doc)
 
@@ -192,13 +175,124 @@ def flatten_list(nested_list: List[List[Any]]) -> List[Any]:
     return list(chain.from_iterable(nested_list))
 
 
-def rephrase(entity):
-    phrasings = {entity}
+def canonical_triples(triples: Iterable[Sequence[str]]) -> List[Tuple[str, ...]]:
+    """A triple set in a canonical order, with duplicates removed."""
+    return sorted(set(map(tuple, triples)))
+
+
+def triples_hash(triples: Iterable[Sequence[str]]) -> str:
+    """
+    A stable 64-bit hash of a triple set, as 16 hex digits. The order of the
+    triples does not matter.
+    """
+    canonical = "\x1e".join("\x1f".join(t) for t in canonical_triples(triples))
+    return blake2b(canonical.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class RephrasingTable:
+    """
+    A `{substring: replacements}` table compiled into one matcher, which
+    tells in a single scan which substrings a phrasing contains.
+
+    Substrings are applied in table order, each one to every phrasing made
+    so far that contains it, including those made by earlier substrings.
+    """
+
+    def __init__(self, table: Dict[str, Iterable[str]]):
+        self.table = list(table.items())
+        self.matcher = AhoCorasick((s, ix) for ix, (s, _) in enumerate(self.table))
+
+    def apply(self, entity: str) -> set:
+        phrasings = {entity}
+        # pending[ix] holds the phrasings that contain substring ix
+        pending = defaultdict(list)
+        for ix in self.matcher.values_in(entity):
+            pending[ix].append(entity)
+
+        for ix, (s, rephs) in enumerate(self.table):
+            for p in pending.pop(ix, ()):
+                for r in rephs:
+                    new_p = p.replace(s, r)
+                    if new_p in phrasings:
+                        continue
+                    phrasings.add(new_p)
+                    # Substrings at or before ix have been applied already
+                    for later_ix in self.matcher.values_in(new_p):
+                        if later_ix > ix:
+                            pending[later_ix].append(new_p)
+        return phrasings
+
 
-    for s, rephs in rephrasing.items():
-        for p in [p for p in set(phrasings) if s in p]:
-            for r in rephs:
-                phrasings.add(p.replace(s, r))
+rephrasing_table = RephrasingTable(rephrasing)
+rephrasing_must_table = RephrasingTable(rephrasing_must)
+
+
+NUMBER_PATTERN = r"^(-?(\d+|\d{1,3}(,\d{3})*)(\.\d+)?)( (\((.*?)\)))?$"
+_numbers = re.compile(NUMBER_PATTERN, re.MULTILINE)
+
+# Units met by `classify_numbers` that are not in `patterns.units`
+unknown_units: Counter = Counter()
+
+
+def classify_numbers(phrasings: Iterable[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+    """
+    The `(number, unit)` of every phrasing that is a number, optionally
+    followed by a unit in parentheses, found in one regex pass over all of
+    them. Units missing from `patterns.units` are counted into
+    `unknown_units`.
+    """
+    lines = "\n".join(p for p in phrasings if "\n" not in p)
+    numbers = {m.group(0): (m.group(1), m.group(7)) for m in _numbers.finditer(lines)}
+    unknown_units.update(
+        unit for _, unit in numbers.values() if unit and unit not in units
+    )
+    return numbers
+
+
+def report_unknown_units() -> None:
+    """Prints the units counted into `unknown_units` so far, and resets them."""
+    if unknown_units:
+        print(
+            "[Info] Units kept as written, as they are unknown:",
+            dict(unknown_units),
+        )
+        unknown_units.clear()
+
+
+@lru_cache(maxsize=None)
+def number_phrasings(number: str, unit: Optional[str]) -> FrozenSet[str]:
+    """The ways a number and its unit (see `patterns.units`) may be written."""
+    number = float(number.replace(",", ""))
+
+    number_phrasing = [str(number), str("{:,}".format(number))]
+    if round(number) == number:
+        number_phrasing.append(str(round(number)))
+        number_phrasing.append(str("{:,}".format(round(number))))
+
+    if not unit:
+        return frozenset(number_phrasing)
+
+    short = units.get(unit, {}).get("short")
+    words = units.get(unit, {}).get("words", [unit])
+
+    phrasings = set()
+    for np in number_phrasing:
+        if short:
+            phrasings.add(np + " " + short)
+            phrasings.add(np + short)
+        for word in words:
+            phrasings.add(np + " " + word)
+    return frozenset(phrasings)
+
+
+def prime_number_phrasings(vocabulary: Iterable[str]) -> None:
+    """Fills the `number_phrasings` cache for every number in `vocabulary`."""
+    for number, unit in classify_numbers(vocabulary).values():
+        number_phrasings(number, unit)
+
+
+def rephrase(entity):
+    phrasings = rephrasing_table.apply(entity)
 
     # Allow rephrase "a/b/.../z" -> every permutation
     for p in set(phrasings):
@@ -206,75 +300,8 @@ def rephrase(entity):
             phrasings.add("/".join(permutation))
 
     # Allow rephrase "number (unit)" -> "number unit", "number unit-short"
-    for p in set(phrasings):
-        match = re.match(r"^(-?(\d+|\d{1,3}(,\d{3})*)(\.\d+)?)( (\((.*?)\)))?$", p)
-        if match:
-            groups = match.groups()
-            number = float(groups[0])
-            unit = groups[6]
-
-            number_phrasing = [str(number), str("{:,}".format(number))]
-            if round(number) == number:
-                number_phrasing.append(str(round(number)))
-                number_phrasing.append(str("{:,}".format(round(number))))
-
-            if unit:
-                couple = None
-                words = [unit]
-
-                if unit == "metres":
-                    couple = "m"
-                    words = [unit, "meters"]
-                elif unit == "millimetres":
-                    couple = "mm"
-                elif unit == "centimetres":
-                    couple = "cm"
-                elif unit == "kilometres":
-                    couple = "km"
-                elif unit == "kilograms":
-                    couple = "kg"
-                elif unit == "litres":
-                    couple = "l"
-                elif unit == "inches":
-                    couple = "''"
-                elif unit in ["degreecelsius", "degreeklsius"]:
-                    words = ["degrees celsius"]
-                elif unit == "grampercubiccentimetres":
-                    words = ["grams per cubic centimetre"]
-                elif unit == "kilometreperseconds":
-                    words = [
-                        "kilometres per second",
-                        "km/s",
-                        "km/sec",
-                        "km per second",
-                        "km per sec",
-                    ]
-                elif unit in ["squarekilometres", "square kilometres"]:
-                    words = ["square kilometres", "sq km"]
-                elif unit == "cubiccentimetres":
-                    couple = "cc"
-                    words = ["cubic centimetres"]
-                elif unit in [
-                    "cubic inches",
-                    "days",
-                    "tonnes",
-                    "square metres",
-                    "inhabitants per square kilometre",
-                    "kelvins",
-                ]:
-                    pass
-                else:
-                    raise ValueError(unit + " is unknown")
-
-                for np in number_phrasing:
-                    if couple:
-                        phrasings.add(np + " " + couple)
-                        phrasings.add(np + couple)
-                    for word in words:
-                        phrasings.add(np + " " + word)
-            else:
-                for np in number_phrasing:
-                    phrasings.add(np)
+    for number, unit in classify_numbers(set(phrasings)).values():
+        phrasings |= number_phrasings(number, unit)
 
     # Allow rephrase "word1 (word2)" -> "word2 word1"
     for p in set(phrasings):
@@ -290,12 +317,7 @@ def rephrase(entity):
 
 
 def rephrase_if_must(entity):
-    phrasings = {entity}
-
-    for s, rephs in rephrasing_must.items():
-        for p in [p for p in set(phrasings) if s in p]:
-            for r in rephs:
-                phrasings.add(p.replace(s, r))
+    phrasings = rephrasing_must_table.apply(entity)
 
     # Allow removing parenthesis "word1 (word2)" -> "word1"
     for p in set(phrasings):